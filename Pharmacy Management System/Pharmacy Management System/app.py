@@ -1,8 +1,11 @@
+import os
 import tkinter as tk
 from tkinter import ttk
-from database import setup_database
+from database import db, setup_database
+from executor import query_executor
 from metadata import TABS_INFO
-from widgets import TableManager, ReportsPanel, QuickSalePanel
+from instrumentation import QueryProfiler, startup_profile
+from widgets import TableManager, ReportsPanel, QuickSalePanel, DiagnosticsPanel
 
 class PharmacyApp:
     def __init__(self, root):
@@ -13,30 +16,83 @@ class PharmacyApp:
         style = ttk.Style()
         style.theme_use('clam')
         
-        setup_database()
+        if os.environ.get("PHARMACY_PROFILE_SQL") == "1":
+            db.profiler = QueryProfiler()
+        with startup_profile.measure("setup_database"):
+            setup_database()
+        query_executor.start(self.root)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(expand=True, fill='both', padx=5, pady=5)
         
+        # Tabs start as empty frames; each panel is built (and starts loading
+        # its data) the first time its tab is selected.
+        self.tab_frames = {}
+        self.tab_factories = {}
+        self.panels = {}
         self.managers = {}
         for table, cols in TABS_INFO.items():
-            frame = TableManager(self.notebook, table, cols)
-            self.notebook.add(frame, text=f"{table}")
-            self.managers[table] = frame
-        
-        reports = ReportsPanel(self.notebook)
-        self.notebook.add(reports, text="Reports")
-        
-        sale_panel = QuickSalePanel(self.notebook)
-        self.notebook.add(sale_panel, text="Quick Sale")
+            self.add_tab(table, lambda parent, table=table, cols=cols: TableManager(parent, table, cols))
+        self.add_tab("Reports", ReportsPanel)
+        self.add_tab("Diagnostics", DiagnosticsPanel)
+        self.add_tab("Quick Sale", QuickSalePanel)
         
+        self.started = False
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_change)
+        self.root.bind("<Map>", self.on_map, add="+")
         
         self.status = tk.StringVar(value="Ready | SQLite Database")
         ttk.Label(self.root, textvariable=self.status, relief="sunken").pack(side="bottom", fill="x")
+        query_executor.add_busy_listener(self.on_busy_change)
+        startup_profile.mark("window created")
+    
+    def add_tab(self, text, factory):
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text)
+        self.tab_frames[text] = frame
+        self.tab_factories[text] = factory
+    
+    def build_tab(self, text):
+        factory = self.tab_factories.pop(text, None)
+        if factory is None:
+            return False
+        with startup_profile.measure(f"build tab {text}"):
+            panel = factory(self.tab_frames[text])
+            panel.pack(expand=True, fill='both')
+        self.panels[text] = panel
+        if isinstance(panel, TableManager):
+            self.managers[text] = panel
+        return True
+    
+    def on_map(self, event):
+        if event.widget is not self.root or self.started:
+            return
+        self.started = True
+        # Runs after the pending redraws, i.e. once the empty window is on screen.
+        self.root.after_idle(self.on_first_paint)
+    
+    def on_first_paint(self):
+        startup_profile.mark("first paint")
+        self.build_tab(self.selected_tab())
+    
+    def selected_tab(self):
+        return self.notebook.tab(self.notebook.select(), "text")
+    
+    def on_busy_change(self, busy):
+        self.status.set("Working... | SQLite Database" if busy else "Ready | SQLite Database")
+        self.root.config(cursor="watch" if busy else "")
+    
+    def on_close(self):
+        query_executor.shutdown()
+        self.root.destroy()
     
     def on_tab_change(self, event):
-        tab = self.notebook.tab(self.notebook.select(), "text")
+        if not self.started:
+            return
+        tab = self.selected_tab()
+        if self.build_tab(tab):
+            return
         if tab in self.managers:
             self.managers[tab].refresh_fk_choices()
             self.managers[tab].load_data()
@@ -0,0 +1,229 @@
+import os
+from datetime import date
+from database import db
+from dates import DAY_COLUMNS, today
+from config import ARCHIVE_DIR
+
+# Closed years of Sales, and optionally Prescription, can be moved out of the
+# main database into an archive database under ARCHIVE_DIR, next to it. The
+# archive keeps each row's day number as an indexed column, so a year is a
+# range of it, and a single ATTACH (as "archive") covers every year. The TEMP
+# views SalesHistory and PrescriptionHistory read the hot table and the
+# archive together; the grids, search and checkout only see the hot tables.
+# The daily rollups keep counting archived sales, see ArchiveMove.
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_TABLES = ("Sales", "Prescription")
+HISTORY_VIEWS = {table: f"{table}History" for table in ARCHIVE_TABLES}
+
+class ArchiveError(Exception):
+    pass
+
+def archive_path():
+    stem = os.path.splitext(os.path.basename(db.path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(db.path)), ARCHIVE_DIR, f"{stem}_archive.db")
+
+def year_days(year):
+    return date(year, 1, 1).toordinal(), date(year + 1, 1, 1).toordinal()
+
+def reads_history(sql):
+    return any(view in sql for view in HISTORY_VIEWS.values())
+
+def _stored_columns(conn, table):
+    # table_info leaves out generated columns, so these are the insertable ones.
+    return [(name, col_type, pk) for _, name, col_type, _, _, pk in conn.execute(f"PRAGMA main.table_info({table})")]
+
+def _history_columns(conn, table):
+    return [name for name, _, _ in _stored_columns(conn, table)] + [DAY_COLUMNS[table][1]]
+
+def _key_column(conn, table):
+    return next(name for name, _, pk in _stored_columns(conn, table) if pk)
+
+def _is_attached(conn):
+    return any(name == ARCHIVE_SCHEMA for _, name, _ in conn.execute("PRAGMA database_list"))
+
+def _create_archive_tables(conn):
+    for table in ARCHIVE_TABLES:
+        day_col = DAY_COLUMNS[table][1]
+        cols = ", ".join(f"{name} {col_type}" + (" PRIMARY KEY" if pk else "")
+                         for name, col_type, pk in _stored_columns(conn, table))
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table} ({cols}, {day_col} INTEGER)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_{table.lower()}_{day_col} "
+                     f"ON {table}({day_col})")
+
+def attach_archives(conn=None, create=False):
+    # Brings this connection's attachment and history views in line with the
+    # archive file on disk, which another process may have created.
+    conn = conn or db.get_connection()
+    if conn.in_transaction:
+        return conn
+    exists = os.path.exists(archive_path())
+    attached = _is_attached(conn)
+    views = conn.execute(
+        f"SELECT COUNT(*) FROM temp.sqlite_master WHERE type = 'view' "
+        f"AND name IN ({', '.join('?' for _ in HISTORY_VIEWS)})", tuple(HISTORY_VIEWS.values())).fetchone()[0]
+    if attached == (exists or create) and views == len(HISTORY_VIEWS):
+        return conn
+
+    for view in HISTORY_VIEWS.values():
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+    if attached and not exists:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+        attached = False
+    if not attached and (exists or create):
+        os.makedirs(os.path.dirname(archive_path()), exist_ok=True)
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path(),))
+        _create_archive_tables(conn)
+        attached = True
+    for table, view in HISTORY_VIEWS.items():
+        cols = ", ".join(_history_columns(conn, table))
+        sql = f"SELECT {cols} FROM main.{table}"
+        if attached:
+            sql += f" UNION ALL SELECT {cols} FROM {ARCHIVE_SCHEMA}.{table}"
+        conn.execute(f"CREATE TEMP VIEW {view} AS {sql}")
+    return conn
+
+def archived_tables(conn=None):
+    # The archive tables a cascade has to follow as well. An archive this
+    # connection could not attach (it is inside a transaction) is refused
+    # rather than left behind with rows pointing at the old keys.
+    conn = attach_archives(conn)
+    if _is_attached(conn):
+        return ARCHIVE_TABLES
+    if os.path.exists(archive_path()):
+        raise ArchiveError("The archive is not attached, archived rows cannot be changed.")
+    return ()
+
+def _same_row(conn, table, left, right):
+    return " AND ".join(f"{left}.{name} IS {right}.{name}" for name, _, _ in _stored_columns(conn, table))
+
+def archive_before(year, prescriptions=False):
+    # Moves every row dated before January 1st of `year` into the archive.
+    if year > today().year:
+        raise ArchiveError(f"Only closed years can be archived, {year - 1} is not over yet.")
+    tables = ARCHIVE_TABLES if prescriptions else ("Sales",)
+    conn = db.get_connection()
+    cutoff = date(year, 1, 1).toordinal()
+    pending = [table for table in tables if conn.execute(
+        f"SELECT 1 FROM {table} WHERE {DAY_COLUMNS[table][1]} < ? LIMIT 1", (cutoff,)).fetchone()]
+    if not pending:
+        return {}
+
+    created = not os.path.exists(archive_path())
+    attach_archives(conn, create=True)
+
+    # SQLite does not commit a transaction across the WAL main database and
+    # the archive atomically, so the move is two commits. The copy commits in
+    # the archive first; the main database then only drops rows whose exact
+    # copy is already there. A crash in between leaves rows in both places,
+    # and re-running the archive finishes the move.
+    try:
+        with db.transaction() as tx:
+            for table in pending:
+                cols = ", ".join(_history_columns(conn, table))
+                tx.execute(f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.{table} ({cols}) "
+                           f"SELECT {cols} FROM main.{table} WHERE {DAY_COLUMNS[table][1]} < ?", (cutoff,))
+    except Exception:
+        if created:
+            _drop_archive(conn)
+        raise
+
+    moved, changed = {}, 0
+    with db.transaction(immediate=True) as tx:
+        for table in pending:
+            day_col = DAY_COLUMNS[table][1]
+            key = _key_column(conn, table)
+            tx.execute("INSERT INTO ArchiveMove (table_name) VALUES (?)", (table,))
+            moved[table] = tx.execute(
+                f"DELETE FROM main.{table} WHERE {day_col} < ? AND EXISTS ("
+                f"SELECT 1 FROM {ARCHIVE_SCHEMA}.{table} a WHERE a.{key} = main.{table}.{key} "
+                f"AND {_same_row(conn, table, 'a', f'main.{table}')})", (cutoff,)).rowcount
+            changed += tx.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {day_col} < ?", (cutoff,)).fetchone()[0]
+        tx.execute("DELETE FROM ArchiveMove")
+    if changed:
+        # Rows written between the two commits stay in the main database.
+        raise ArchiveError(f"{changed} rows changed while archiving and were kept; run the archive again.")
+    return moved
+
+def restore_year(year):
+    conn = attach_archives()
+    if not _is_attached(conn):
+        raise ArchiveError("There is no archive.")
+    lo, hi = year_days(year)
+    if not any(conn.execute(f"SELECT 1 FROM {ARCHIVE_SCHEMA}.{table} WHERE {DAY_COLUMNS[table][1]} >= ? "
+                            f"AND {DAY_COLUMNS[table][1]} < ? LIMIT 1", (lo, hi)).fetchone()
+               for table in ARCHIVE_TABLES):
+        raise ArchiveError(f"Nothing archived for {year}.")
+
+    # The main database is authoritative: rows go back first, then only the
+    # archived copies of rows now present in main are removed.
+    restored = {}
+    with db.transaction(immediate=True) as tx:
+        for table in ARCHIVE_TABLES:
+            day_col = DAY_COLUMNS[table][1]
+            cols = ", ".join(name for name, _, _ in _stored_columns(conn, table))
+            tx.execute("INSERT INTO ArchiveMove (table_name) VALUES (?)", (table,))
+            restored[table] = tx.execute(
+                f"INSERT OR IGNORE INTO main.{table} ({cols}) SELECT {cols} FROM {ARCHIVE_SCHEMA}.{table} "
+                f"WHERE {day_col} >= ? AND {day_col} < ?", (lo, hi)).rowcount
+        tx.execute("DELETE FROM ArchiveMove")
+    with db.transaction() as tx:
+        for table in ARCHIVE_TABLES:
+            day_col = DAY_COLUMNS[table][1]
+            key = _key_column(conn, table)
+            tx.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.{table} WHERE {day_col} >= ? AND {day_col} < ? "
+                       f"AND {key} IN (SELECT {key} FROM main.{table})", (lo, hi))
+    return restored
+
+def _drop_archive(conn):
+    for view in HISTORY_VIEWS.values():
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+    conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+    os.remove(archive_path())
+    attach_archives(conn)
+
+def archive_summary():
+    # (year, archived sales, archived prescriptions)
+    conn = attach_archives()
+    if not _is_attached(conn):
+        return []
+    counts = {}
+    for i, table in enumerate(ARCHIVE_TABLES):
+        date_col = DAY_COLUMNS[table][0]
+        for year, count in conn.execute(
+                f"SELECT substr({date_col}, 1, 4), COUNT(*) FROM {ARCHIVE_SCHEMA}.{table} GROUP BY 1"):
+            counts.setdefault(int(year), [0] * len(ARCHIVE_TABLES))[i] = count
+    return [(year, *counts[year]) for year in sorted(counts)]
+
+if __name__ == "__main__":
+    import argparse
+    from database import setup_database
+
+    parser = argparse.ArgumentParser(description="Move closed years of sales into the archive database and back.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show the archived years")
+    archive_cmd = sub.add_parser("archive", help="archive every year before the given one")
+    archive_cmd.add_argument("--before", type=int, default=today().year,
+                             help="first year to keep in the main database (default: this year)")
+    archive_cmd.add_argument("--prescriptions", action="store_true", help="archive prescriptions as well")
+    restore_cmd = sub.add_parser("restore", help="move an archived year back into the main database")
+    restore_cmd.add_argument("year", type=int)
+    args = parser.parse_args()
+
+    setup_database()
+    try:
+        if args.command == "archive":
+            moved = archive_before(args.before, args.prescriptions)
+            for table, count in moved.items():
+                print(f"{table}: {count} rows archived")
+            if not moved:
+                print("Nothing to archive.")
+        elif args.command == "restore":
+            for table, count in restore_year(args.year).items():
+                print(f"{args.year} {table}: {count} rows restored")
+        summary = archive_summary()
+        if summary:
+            print(f"{archive_path()} ({os.path.getsize(archive_path()) / 1024:.0f} KiB):")
+        for year, sales, prescriptions in summary:
+            print(f"  {year}: {sales} sales, {prescriptions} prescriptions")
+    except ArchiveError as e:
+        parser.exit(1, f"{e}\n")
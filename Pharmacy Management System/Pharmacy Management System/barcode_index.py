@@ -0,0 +1,35 @@
+import threading
+from database import db
+from fk_cache import get_table_version
+
+# barcode -> (medicine_id, name, price), held in memory so a scan is a dict
+# lookup. refresh() only reloads when the Medicines TableVersion has moved;
+# the dict is swapped whole, so lookups never need the lock.
+class BarcodeIndex:
+    def __init__(self):
+        self.version = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def refresh(self):
+        with self._lock:
+            version = get_table_version("Medicines")
+            if version != self.version:
+                rows = db.execute_query(
+                    "SELECT barcode, medicine_id, name, COALESCE(price, 0) FROM Medicines "
+                    "WHERE barcode IS NOT NULL AND medicine_id IS NOT NULL", fetch=True)
+                self._entries = {str(code).strip(): (mid, name, price) for code, mid, name, price in rows}
+                self.version = version
+            return self
+
+    def lookup(self, barcode):
+        return self._entries.get(barcode.strip())
+
+    def __len__(self):
+        return len(self._entries)
+
+barcode_index = BarcodeIndex()
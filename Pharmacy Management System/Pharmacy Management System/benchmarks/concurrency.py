@@ -0,0 +1,96 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, setup_database
+from checkout import checkout, checkout_stats, InsufficientStockError
+from stock_summary import find_stock_summary_mismatches
+
+# Many processes selling from the same few medicines at once; afterwards the
+# stock must add up exactly and no lot may have gone negative.
+
+COUNTERS = ("baskets", "attempts", "conflicts", "busy", "retries")
+
+def terminal(path, worker, baskets, medicine_ids, p_ids, seed):
+    db.set_path(path)
+    rng = random.Random(seed + worker)
+    # checkout_stats is per process and the pool reuses processes, so only
+    # count what this task added.
+    before = {key: getattr(checkout_stats, key) for key in COUNTERS}
+    sold_out = failed = 0
+    for _ in range(baskets):
+        items = [{'medicine_id': mid, 'medicine_name': str(mid), 'quantity': rng.randint(1, 3), 'subtotal': 1.0}
+                 for mid in rng.sample(medicine_ids, rng.randint(1, min(3, len(medicine_ids))))]
+        try:
+            checkout(rng.choice(p_ids), items)
+        except InsufficientStockError:
+            sold_out += 1
+        except Exception:
+            failed += 1
+    counts = {key: getattr(checkout_stats, key) - before[key] for key in COUNTERS}
+    return dict(counts, sold_out=sold_out, failed=failed)
+
+def stock_totals(medicine_ids):
+    placeholders = ", ".join("?" for _ in medicine_ids)
+    return db.execute_query(
+        f"SELECT COALESCE(SUM(quantity), 0), COALESCE(MIN(quantity), 0) FROM Stock WHERE medicine_id IN ({placeholders})",
+        tuple(medicine_ids), fetch=True)[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run concurrent checkouts from several processes and check stock stays consistent.")
+    parser.add_argument("db", help="database to write to (use a generated copy)")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--baskets", type=int, default=200, help="baskets per process")
+    parser.add_argument("--medicines", type=int, default=5, help="size of the contended set of medicines")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist, create one with benchmarks.generate")
+    db.set_path(args.db)
+    setup_database()
+
+    medicine_ids = [r[0] for r in db.execute_query(
+        "SELECT medicine_id FROM StockSummary WHERE on_hand > 0 ORDER BY on_hand DESC LIMIT ?",
+        (args.medicines,), fetch=True)]
+    p_ids = [r[0] for r in db.execute_query("SELECT p_id FROM Pharmacist", fetch=True)]
+    if not medicine_ids or not p_ids:
+        parser.error("the database needs stocked medicines and at least one pharmacist")
+    before_stock, _ = stock_totals(medicine_ids)
+    last_sale = db.execute_query("SELECT COALESCE(MAX(rowid), 0) FROM Sales", fetch=True)[0][0]
+    db.close_all()
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.starmap(terminal, [(args.db, w, args.baskets, medicine_ids, p_ids, args.seed)
+                                          for w in range(args.processes)])
+    elapsed = time.perf_counter() - start
+
+    totals = {key: sum(r[key] for r in results) for key in results[0]}
+    after_stock, min_quantity = stock_totals(medicine_ids)
+    placeholders = ", ".join("?" for _ in medicine_ids)
+    sold = db.execute_query(
+        f"SELECT COALESCE(SUM(quantity), 0) FROM Sales WHERE rowid > ? AND medicine_id IN ({placeholders})",
+        (last_sale,) + tuple(medicine_ids), fetch=True)[0][0]
+    mismatches = find_stock_summary_mismatches()
+
+    print(f"{args.processes} processes x {args.baskets} baskets on {len(medicine_ids)} medicines in {elapsed:.2f} s")
+    print(f"  completed {totals['baskets']} ({totals['baskets'] / elapsed:.1f}/s), "
+          f"sold out {totals['sold_out']}, failed {totals['failed']}")
+    attempts = totals['attempts'] or 1
+    print(f"  attempts {totals['attempts']}, conflicts {totals['conflicts']} ({totals['conflicts'] / attempts:.1%}), "
+          f"busy {totals['busy']} ({totals['busy'] / attempts:.1%}), retries {totals['retries']}")
+    print(f"  stock {before_stock} -> {after_stock}, sold {sold}, lowest lot quantity {min_quantity}, "
+          f"summary mismatches {len(mismatches)}")
+
+    consistent = before_stock - after_stock == sold and min_quantity >= 0 and not mismatches
+    print("OK" if consistent else "INCONSISTENT")
+    if not consistent:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, setup_database
+
+SCALES = {
+    "tiny": {"manufacturers": 20, "medicines": 500, "stock": 5000, "patients": 1000,
+             "doctors": 50, "pharmacists": 5, "prescriptions": 5000, "sales": 20000},
+    "small": {"manufacturers": 100, "medicines": 5000, "stock": 100000, "patients": 20000,
+              "doctors": 300, "pharmacists": 10, "prescriptions": 100000, "sales": 200000},
+    "large": {"manufacturers": 500, "medicines": 50000, "stock": 2000000, "patients": 200000,
+              "doctors": 2000, "pharmacists": 30, "prescriptions": 1000000, "sales": 2000000},
+}
+
+SYLLABLES = ["ab", "ac", "al", "am", "an", "ar", "ba", "ce", "ci", "da", "de", "di", "fa", "fen",
+             "ga", "im", "in", "ka", "lo", "lor", "ma", "mi", "mo", "na", "ne", "ol", "om", "pa",
+             "pra", "ra", "ri", "sa", "se", "ta", "te", "ti", "to", "tra", "va", "vi", "xa", "zo"]
+SUFFIXES = ["cin", "dol", "fen", "lol", "mab", "pine", "pril", "sartan", "statin", "zole", "mycin", "xin"]
+FIRST_NAMES = ["James", "Mary", "John", "Linda", "Ahmet", "Ayse", "Mehmet", "Fatma", "David", "Emily",
+               "Can", "Elif", "Murat", "Zeynep", "Robert", "Sarah", "Ali", "Deniz", "Omer", "Selin"]
+LAST_NAMES = ["Smith", "Johnson", "Yilmaz", "Kaya", "Demir", "Brown", "Sahin", "Celik", "Taylor",
+              "Ozturk", "Wilson", "Aydin", "Clark", "Arslan", "Lewis", "Dogan", "Walker", "Kilic"]
+SPECIALIZATIONS = ["Cardiology", "Neurology", "Pediatrics", "Oncology", "Dermatology", "Internal Medicine"]
+
+BATCH_SIZE = 50000
+
+def _drug_name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))).capitalize() + rng.choice(SUFFIXES)
+
+def _phone(rng):
+    return f"+90-5{rng.randint(0, 99):02d}-{rng.randint(0, 9999999):07d}"
+
+def _day(base, rng, back, forward=0):
+    return (base + timedelta(days=rng.randint(-back, forward))).isoformat()
+
+def _insert(sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.execute_many(sql, batch)
+            batch = []
+    if batch:
+        db.execute_many(sql, batch)
+
+def generate_database(path, counts, seed=42, today=None):
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    rng = random.Random(seed)
+    today = today or date.today()
+    db.set_path(path)
+    setup_database()
+    timings = {}
+
+    def step(name, sql, rows):
+        start = time.perf_counter()
+        _insert(sql, rows)
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    n = counts
+    step("manufacturers", "INSERT INTO Manufacturer VALUES (?, ?, ?, ?)",
+         ((i, f"{rng.choice(LAST_NAMES)} Pharma {i}", _phone(rng), f"{rng.randint(1, 999)} Industry Rd")
+          for i in range(1, n["manufacturers"] + 1)))
+    prices = {}
+    def medicines():
+        for i in range(1, n["medicines"] + 1):
+            prices[i] = round(rng.uniform(1, 250), 2)
+            yield (i, f"{_drug_name(rng)} {rng.choice([5, 10, 20, 50, 100, 250, 500])}mg #{i}",
+                   f"869{i:010d}", prices[i], rng.randint(1, n["manufacturers"]))
+    step("medicines", "INSERT INTO Medicines VALUES (?, ?, ?, ?, ?)", medicines())
+    step("stock", "INSERT INTO Stock (medicine_id, quantity, expiration_date) VALUES (?, ?, ?)",
+         ((rng.randint(1, n["medicines"]), rng.randint(0, 200), _day(today, rng, 365, 3 * 365))
+          for _ in range(n["stock"])))
+    step("patients", "INSERT INTO Patient (first_name, last_name, tc_no, birth_date, phone, address) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+         ((rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"{10000000000 + i}",
+           _day(today, rng, 95 * 365, -365), _phone(rng), f"{rng.randint(1, 500)} Main St")
+          for i in range(n["patients"])))
+    step("doctors", "INSERT INTO Doctor VALUES (?, ?, ?, ?, ?)",
+         ((i, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), _phone(rng), rng.choice(SPECIALIZATIONS))
+          for i in range(1, n["doctors"] + 1)))
+    step("pharmacists", "INSERT INTO Pharmacist VALUES (?, ?, ?, ?, ?, ?)",
+         ((i, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), _phone(rng), "Pharmacy St",
+           _day(today, rng, 10 * 365)) for i in range(1, n["pharmacists"] + 1)))
+    step("prescriptions", "INSERT INTO Prescription (patient_id, doctor_id, prescription_date, medicine_id) "
+                          "VALUES (?, ?, ?, ?)",
+         ((rng.randint(1, n["patients"]), rng.randint(1, n["doctors"]), _day(today, rng, 3 * 365),
+           rng.randint(1, n["medicines"])) for _ in range(n["prescriptions"])))
+    def sales():
+        for _ in range(n["sales"]):
+            mid = rng.randint(1, n["medicines"])
+            qty = rng.randint(1, 5)
+            yield (rng.randint(1, n["pharmacists"]), mid, qty, _day(today, rng, 3 * 365), round(prices[mid] * qty, 2))
+    step("sales", "INSERT INTO Sales (p_id, medicine_id, quantity, sale_date, total_price) VALUES (?, ?, ?, ?, ?)",
+         sales())
+
+    db.execute_query("ANALYZE")
+    return timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic pharmacy database.")
+    parser.add_argument("path")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, help="anchor date for generated dates (YYYY-MM-DD)")
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name}", type=int, help=f"override the number of {name}")
+    args = parser.parse_args(argv)
+
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+    timings = generate_database(args.path, counts, args.seed, args.today)
+    for name, secs in timings.items():
+        print(f"{name:<14} {counts[name]:>9} rows  {secs:8.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, setup_database
+from metadata import TABS_INFO, FK_MAP
+from queries import SQLQueries
+from paging import KeysetPager
+from search import search_rows
+from fk_cache import fk_cache
+from stock_summary import get_stock_summary
+from barcode_index import barcode_index
+import expiry
+from expiry import classify_days, expiry_day_sql, row_expiry_codes
+from checkout import checkout, InsufficientStockError
+from archive import reads_history, attach_archives
+from utils import fetch_all, fetch_fk_choices, date_range_params, daily_sales_limit
+
+def percentile(sorted_samples, p):
+    index = max(0, math.ceil(p * len(sorted_samples)) - 1)
+    return sorted_samples[min(index, len(sorted_samples) - 1)]
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def measure(fn, repeat, setup=None):
+    samples = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def report_benchmarks():
+    all_days = date_range_params("", "")
+    return {
+        "get_medicines_with_stock": (SQLQueries.get_medicines_with_stock(), None),
+        "get_low_stock": (SQLQueries.get_low_stock(10), None),
+        "get_expiring_soon": (SQLQueries.get_expiring_soon(30), None),
+        "get_daily_sales": (SQLQueries.get_daily_sales(daily_sales_limit(all_days)), all_days),
+        "get_top_selling": (SQLQueries.get_top_selling(10), all_days),
+        "get_oldest_patient": (SQLQueries.get_oldest_patient(), None),
+        "get_malformed_dates": (SQLQueries.get_malformed_dates(), None),
+        "get_sales_by_year": (SQLQueries.get_sales_by_year(), None),
+    }
+
+def sample_terms(rng, count):
+    names = db.execute_query("SELECT name FROM Medicines ORDER BY random() LIMIT ?", (count,), fetch=True)
+    patients = db.execute_query("SELECT last_name, tc_no FROM Patient ORDER BY random() LIMIT ?", (count,), fetch=True)
+    medicine_terms = [n[0][:rng.randint(3, 6)] for n in names] or ["a"]
+    patient_terms = [p[0][:4] if i % 2 else p[1][:7] for i, p in enumerate(patients)] or ["a"]
+    return medicine_terms, patient_terms
+
+def run_benchmarks(repeat, fetch_all_repeat, basket_size, seed=42):
+    rng = random.Random(seed)
+    results = {}
+
+    for name, (sql, params) in report_benchmarks().items():
+        if reads_history(sql):
+            attach_archives()
+        results[f"SQLQueries.{name}"] = measure(lambda i: db.execute_query(sql, params, fetch=True), repeat)
+
+    for table in TABS_INFO:
+        results[f"fetch_all.{table}"] = measure(lambda i: fetch_all(table), fetch_all_repeat)
+
+    for table in TABS_INFO:
+        pager = KeysetPager(table, TABS_INFO[table])
+        max_rowid = db.execute_query(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}", fetch=True)[0][0]
+        results[f"page.first.{table}"] = measure(lambda i: pager.first_page(), repeat)
+        results[f"page.deep.{table}"] = measure(lambda i: pager.page_after(rng.randint(0, max_rowid)), repeat)
+        results[f"page.count.{table}"] = measure(lambda i: pager.count(), repeat)
+
+    medicine_terms, patient_terms = sample_terms(rng, repeat)
+    for table, terms in (("Medicines", medicine_terms), ("Patient", patient_terms)):
+        cols = TABS_INFO[table]
+        results[f"search.{table}"] = measure(
+            lambda i: search_rows(table, cols, terms[i % len(terms)]), repeat)
+        like_cols = " OR ".join(f"CAST({c} AS TEXT) LIKE ?" for c in cols)
+        results[f"search_like.{table}"] = measure(
+            lambda i: KeysetPager(table, cols, like_cols, [f"%{terms[i % len(terms)]}%"] * len(cols)).first_page(),
+            repeat)
+
+    specs = {spec for cols in FK_MAP.values() for spec in cols.values()}
+    for ref_table, id_col, display_col in sorted(specs):
+        name = f"{ref_table}.{display_col}"
+        results[f"fetch_fk_choices.cold.{name}"] = measure(
+            lambda i: fetch_fk_choices(ref_table, id_col, display_col), repeat,
+            setup=lambda i: fk_cache.invalidate(ref_table))
+        results[f"fetch_fk_choices.warm.{name}"] = measure(
+            lambda i: fetch_fk_choices(ref_table, id_col, display_col), repeat)
+
+    # Column classification alone, on the Stock day numbers tiled to a
+    # million lots; "numpy" records which path was measured.
+    days = [r[0] for r in db.execute_query("SELECT COALESCE(expiration_day, 0) FROM Stock", fetch=True)] or [0]
+    days = (days * (1_000_000 // len(days) + 1))[:1_000_000]
+    if expiry.np is not None:
+        days = expiry.np.asarray(days, dtype=expiry.np.int64)
+    results["expiry.classify_days.1M"] = measure(lambda i: classify_days(days), repeat)
+    results["expiry.classify_days.1M"]["numpy"] = expiry.np is not None
+    for table in ("Stock", "Medicines"):
+        cols = TABS_INFO[table]
+        pager = KeysetPager(table, cols, extra=[expiry_day_sql(table)])
+        results[f"expiry.page_tags.{table}"] = measure(lambda i: row_expiry_codes(table, pager.first_page()), repeat)
+
+    stocked = [r[0] for r in db.execute_query(
+        "SELECT medicine_id FROM StockSummary WHERE on_hand >= 50 ORDER BY random() LIMIT 2000", fetch=True)]
+    pharmacists = [r[0] for r in db.execute_query("SELECT p_id FROM Pharmacist", fetch=True)]
+    if stocked:
+        results["stock_summary.lookup"] = measure(lambda i: get_stock_summary(stocked[i % len(stocked)]), repeat)
+
+    # What a scan waits for before the line is in the cart; the stock check
+    # above runs afterwards in the background.
+    barcode_index.refresh()
+    barcodes = [r[0] for r in db.execute_query(
+        "SELECT barcode FROM Medicines WHERE barcode IS NOT NULL ORDER BY random() LIMIT 2000", fetch=True)] or [""]
+    results["barcode_index.lookup"] = measure(lambda i: barcode_index.lookup(barcodes[i % len(barcodes)]), repeat)
+
+    if stocked and pharmacists:
+        baskets = [[{'medicine_id': mid, 'quantity': 1, 'subtotal': 1.0}
+                    for mid in rng.sample(stocked, min(basket_size, len(stocked)))] for _ in range(repeat)]
+        def sell(i):
+            try:
+                checkout(rng.choice(pharmacists), baskets[i])
+            except InsufficientStockError:
+                pass
+        results[f"checkout.basket_{basket_size}"] = measure(sell, repeat)
+        per_basket = results[f"checkout.basket_{basket_size}"]["mean_ms"] / 1000
+        results[f"checkout.basket_{basket_size}"]["baskets_per_second"] = round(1 / per_basket, 1) if per_basket else None
+
+    return results
+
+def table_counts():
+    return {t: db.execute_query(f"SELECT COUNT(*) FROM {t}", fetch=True)[0][0] for t in TABS_INFO}
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, stats in sorted(results.items()):
+        old = baseline.get(name)
+        if not old or not old["p50_ms"]:
+            continue
+        ratio = stats["p50_ms"] / old["p50_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {old['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the pharmacy hot paths against a database without Tk.")
+    parser.add_argument("db", help="database to benchmark (checkout writes to it, use a generated copy)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--fetch-all-repeat", type=int, default=3)
+    parser.add_argument("--basket-size", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist, create one with benchmarks.generate")
+    db.set_path(args.db)
+    setup_database()
+
+    results = run_benchmarks(args.repeat, args.fetch_all_repeat, args.basket_size, args.seed)
+    output = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "database": os.path.abspath(args.db),
+            "rows": table_counts(),
+            "sqlite_version": sqlite3.sqlite_version,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(output, f, indent=2)
+
+    for name, stats in results.items():
+        print(f"{name:<48} p50 {stats['p50_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from database import db
+from metadata import FK_MAP, KEY_FIELDS
+from migrations import SALES_ROLLUPS
+from dates import day_text_sql
+from archive import ARCHIVE_SCHEMA, archived_tables
+
+# Deletes that follow FK_MAP: deleting a row also deletes every row that
+# references it, directly or through other tables (a manufacturer takes its
+# medicines, and their stock, prescriptions and sales, with it). Each
+# dependent table is selected with nested IN (SELECT ...) filters, so the
+# whole cascade is a handful of set-based statements. Archived Sales and
+# Prescription rows are deleted with their hot counterparts, see
+# archive.archived_tables.
+
+def referencing_tables(table):
+    return [(child, col, ref_col)
+            for child, fks in FK_MAP.items()
+            for col, (ref_table, ref_col, _) in fks.items()
+            if ref_table == table]
+
+class CascadeDelete:
+    def __init__(self, table, key_values):
+        self.table = table
+        keys = KEY_FIELDS[table]
+        root_where = " AND ".join(f"{k} = ?" for k in keys)
+        root_params = tuple(key_values[k] for k in keys)
+        # table -> [(where, params)], in discovery order (parents before children).
+        self.filters = {table: [(root_where, root_params)]}
+        self.depth = {table: 0}
+        self._walk(table, root_where, root_params, 1, (table,))
+
+    def _walk(self, parent, parent_where, parent_params, depth, path):
+        for child, col, ref_col in referencing_tables(parent):
+            if child in path:
+                continue
+            where = f"{col} IN (SELECT {ref_col} FROM {parent} WHERE {parent_where})"
+            self.filters.setdefault(child, []).append((where, parent_params))
+            self.depth[child] = max(self.depth.get(child, 0), depth)
+            self._walk(child, where, parent_params, depth + 1, path + (child,))
+
+    def where(self, table):
+        filters = self.filters[table]
+        sql = " OR ".join(f"({w})" for w, _ in filters)
+        params = tuple(p for _, ps in filters for p in ps)
+        return sql, params
+
+    @property
+    def dependents(self):
+        return [t for t in self.filters if t != self.table]
+
+    def _sources(self, table, archived):
+        # The selected row itself is always a hot one.
+        sources = [f"main.{table}"]
+        if table in archived and table != self.table:
+            sources.append(f"{ARCHIVE_SCHEMA}.{table}")
+        return sources
+
+    def related_counts(self):
+        # One round trip for the confirmation dialog.
+        if not self.dependents:
+            return {}
+        archived = archived_tables()
+        parts = []
+        params = ()
+        for table in self.dependents:
+            where, where_params = self.where(table)
+            for source in self._sources(table, archived):
+                parts.append(f"SELECT '{table}', COUNT(*) FROM {source} WHERE {where}")
+                params += where_params
+        counts = {}
+        for table, count in db.execute_query(" UNION ALL ".join(parts), params, fetch=True):
+            counts[table] = counts.get(table, 0) + count
+        return counts
+
+    def execute(self):
+        # Children first, so the IN (SELECT ...) filters still see their parents.
+        order = sorted(self.filters, key=lambda t: -self.depth[t])
+        archived = archived_tables()
+        deleted = {}
+        with db.transaction(immediate=True) as conn:
+            for table in order:
+                where, params = self.where(table)
+                deleted[table] = 0
+                for source in self._sources(table, archived):
+                    if source.startswith(ARCHIVE_SCHEMA) and table == "Sales":
+                        _drop_archived_sales(conn, where, params)
+                    deleted[table] += conn.execute(f"DELETE FROM {source} WHERE {where}", params).rowcount
+        return deleted
+
+def _drop_archived_sales(conn, where, params):
+    # The rollups still count archived sales (the triggers on Sales only see
+    # hot rows), so take the deleted ones out by hand.
+    for rollup, key in SALES_ROLLUPS:
+        keys = f", {key}" if key else ""
+        match = "r.day = d.day" + (f" AND r.{key} = d.{key}" if key else "")
+        conn.execute(f'''UPDATE {rollup} AS r SET
+                sales = r.sales - d.sales,
+                quantity = r.quantity - d.quantity,
+                revenue = r.revenue - d.revenue
+            FROM (SELECT {day_text_sql("sale_day")} AS day{keys}, COUNT(*) AS sales,
+                         COALESCE(SUM(quantity), 0) AS quantity, COALESCE(SUM(total_price), 0) AS revenue
+                  FROM {ARCHIVE_SCHEMA}.Sales
+                  WHERE sale_day IS NOT NULL{f" AND {key} IS NOT NULL" if key else ""} AND ({where})
+                  GROUP BY sale_day{keys}) AS d
+            WHERE {match}''', params)
+        conn.execute(f"DELETE FROM {rollup} WHERE sales <= 0")
+
+# Changing a referenced id (e.g. Medicines.medicine_id) moves every row that
+# points at the old value, using the FK indexes on the referencing columns,
+# archived rows included.
+class CascadeRekey:
+    def __init__(self, table, column, old_value, new_value):
+        self.table = table
+        self.column = column
+        self.old_value = old_value
+        self.new_value = new_value
+        self.references = [(child, col) for child, col, ref_col in referencing_tables(table) if ref_col == column]
+
+    def _sources(self, archived):
+        return [(child, col, source) for child, col in self.references
+                for source in [f"main.{child}"] + ([f"{ARCHIVE_SCHEMA}.{child}"] if child in archived else [])]
+
+    def related_counts(self):
+        # Also attaches the archive on this connection; apply() cannot do
+        # that inside a transaction, see archive.attach_archives.
+        if not self.references:
+            return {}
+        sources = self._sources(archived_tables())
+        sql = " UNION ALL ".join(f"SELECT '{child}', COUNT(*) FROM {source} WHERE {col} = ?"
+                                 for child, col, source in sources)
+        counts = {}
+        for table, count in db.execute_query(sql, (self.old_value,) * len(sources), fetch=True):
+            counts[table] = counts.get(table, 0) + count
+        return counts
+
+    def apply(self, conn):
+        # Run inside the caller's transaction, together with the row's own update.
+        sources = self._sources(archived_tables(conn))
+        # Every sale under the old id moves, hot or archived, so the rollup
+        # rows move whole; ArchiveMove keeps the Sales triggers out of it.
+        conn.execute("INSERT INTO ArchiveMove (table_name) VALUES ('Sales')")
+        moved = {}
+        for child, col, source in sources:
+            moved[child] = moved.get(child, 0) + conn.execute(
+                f"UPDATE {source} SET {col} = ? WHERE {col} = ?", (self.new_value, self.old_value)).rowcount
+        for rollup, key in SALES_ROLLUPS:
+            if ("Sales", key) in self.references:
+                conn.execute(f'''INSERT INTO {rollup} (day, {key}, sales, quantity, revenue)
+                    SELECT day, ?, sales, quantity, revenue FROM {rollup} WHERE {key} = ?
+                    ON CONFLICT(day, {key}) DO UPDATE SET
+                        sales = sales + excluded.sales,
+                        quantity = quantity + excluded.quantity,
+                        revenue = revenue + excluded.revenue''', (self.new_value, self.old_value))
+                conn.execute(f"DELETE FROM {rollup} WHERE {key} = ?", (self.old_value,))
+        conn.execute("DELETE FROM ArchiveMove WHERE table_name = 'Sales'")
+        return moved
@@ -0,0 +1,193 @@
+import time
+import random
+import sqlite3
+import threading
+from database import db
+from dates import today
+from config import CHECKOUT_MAX_RETRIES, CHECKOUT_RETRY_BACKOFF_MS
+
+class InsufficientStockError(Exception):
+    def __init__(self, medicine_id, name, available, required):
+        self.medicine_id = medicine_id
+        self.name = name
+        self.available = available
+        self.required = required
+        super().__init__(f"Insufficient stock for {name}! Available: {available}, Required: {required}")
+
+class StockConflictError(Exception):
+    def __init__(self):
+        super().__init__("Stock changed while the sale was being recorded, please try again.")
+
+class Receipt:
+    def __init__(self, p_id, sale_date, lines, elapsed):
+        self.p_id = p_id
+        self.sale_date = sale_date
+        self.lines = lines
+        self.elapsed = elapsed
+
+    @property
+    def item_count(self):
+        return len(self.lines)
+
+    @property
+    def total(self):
+        return sum(line['subtotal'] for line in self.lines)
+
+class CheckoutStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.baskets = 0
+        self.lines = 0
+        self.elapsed = 0.0
+        self.attempts = 0
+        self.conflicts = 0
+        self.busy = 0
+        self.retries = 0
+
+    def record(self, receipt):
+        with self._lock:
+            self.baskets += 1
+            self.lines += receipt.item_count
+            self.elapsed += receipt.elapsed
+
+    def record_attempt(self, conflict=False, busy=False, retry=False):
+        with self._lock:
+            self.attempts += 1
+            self.conflicts += conflict
+            self.busy += busy
+            self.retries += retry
+
+    def conflict_rate(self):
+        return (self.conflicts + self.busy) / self.attempts if self.attempts else 0.0
+
+    def retries_per_basket(self):
+        return self.retries / self.baskets if self.baskets else 0.0
+
+    def baskets_per_second(self):
+        return self.baskets / self.elapsed if self.elapsed else 0.0
+
+    def mean_ms(self):
+        return self.elapsed * 1000 / self.baskets if self.baskets else 0.0
+
+checkout_stats = CheckoutStats()
+
+def _merge_lines(items):
+    merged = {}
+    for item in items:
+        mid = item['medicine_id']
+        line = merged.get(mid)
+        if line is None:
+            merged[mid] = {
+                'medicine_id': mid,
+                'medicine_name': item.get('medicine_name', str(mid)),
+                'quantity': item['quantity'],
+                'subtotal': item['subtotal'],
+            }
+        else:
+            line['quantity'] += item['quantity']
+            line['subtotal'] += item['subtotal']
+    return list(merged.values())
+
+def _check_availability(conn, lines):
+    placeholders = ", ".join("?" for _ in lines)
+    on_hand = dict(conn.execute(
+        f"SELECT medicine_id, on_hand FROM StockSummary WHERE medicine_id IN ({placeholders})",
+        tuple(line['medicine_id'] for line in lines)
+    ).fetchall())
+    for line in lines:
+        available = on_hand.get(line['medicine_id'], 0)
+        if available < line['quantity']:
+            raise InsufficientStockError(line['medicine_id'], line['medicine_name'], available, line['quantity'])
+
+def _load_lots(conn, medicine_ids):
+    placeholders = ", ".join("?" for _ in medicine_ids)
+    rows = conn.execute(
+        f"SELECT stock_id, medicine_id, quantity, row_version FROM Stock "
+        f"WHERE medicine_id IN ({placeholders}) AND quantity > 0 "
+        f"ORDER BY medicine_id, expiration_date IS NULL, expiration_date, stock_id",
+        tuple(medicine_ids)
+    ).fetchall()
+    lots = {mid: [] for mid in medicine_ids}
+    for stock_id, mid, qty, version in rows:
+        lots[mid].append((stock_id, qty, version))
+    return lots
+
+def _allocate(line, lots):
+    # First-expiry-first-out over the lots of one medicine.
+    available = sum(qty for _, qty, _ in lots)
+    if available < line['quantity']:
+        raise InsufficientStockError(line['medicine_id'], line['medicine_name'], available, line['quantity'])
+    remaining = line['quantity']
+    allocation = []
+    for stock_id, qty, version in lots:
+        if remaining <= 0:
+            break
+        deduct = min(remaining, qty)
+        allocation.append((stock_id, deduct, version))
+        remaining -= deduct
+    return allocation
+
+def _plan(conn, lines):
+    _check_availability(conn, lines)
+    lots = _load_lots(conn, [line['medicine_id'] for line in lines])
+    guards = []
+    for line in lines:
+        allocation = _allocate(line, lots[line['medicine_id']])
+        line['lots'] = [(stock_id, qty) for stock_id, qty, _ in allocation]
+        guards.extend((qty, stock_id, qty, version) for stock_id, qty, version in allocation)
+    return guards
+
+def _apply(conn, p_id, lines, sale_date, guards):
+    # Each lot is only decremented if it still holds the quantity at the
+    # version that was read; anything else means another sale got there first.
+    cursor = conn.executemany(
+        "UPDATE Stock SET quantity = quantity - ?, row_version = row_version + 1 "
+        "WHERE stock_id = ? AND quantity >= ? AND row_version = ?",
+        guards
+    )
+    if cursor.rowcount != len(guards):
+        raise StockConflictError()
+    conn.executemany(
+        "INSERT INTO Sales (p_id, medicine_id, quantity, sale_date, total_price) VALUES (?, ?, ?, ?, ?)",
+        [(p_id, line['medicine_id'], line['quantity'], sale_date, line['subtotal']) for line in lines]
+    )
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+def checkout(p_id, items, sale_date=None):
+    start = time.perf_counter()
+    lines = _merge_lines(items)
+    if not lines:
+        raise ValueError("Cart is empty!")
+    sale_date = sale_date or today().isoformat()
+
+    # Plan against a read snapshot without holding the write lock, then apply
+    # with guarded updates; on a conflict or a busy database, re-plan after a
+    # short randomized backoff.
+    for attempt in range(CHECKOUT_MAX_RETRIES + 1):
+        retry = attempt < CHECKOUT_MAX_RETRIES
+        try:
+            with db.transaction() as conn:
+                guards = _plan(conn, lines)
+            with db.transaction(immediate=True) as conn:
+                _apply(conn, p_id, lines, sale_date, guards)
+        except StockConflictError:
+            checkout_stats.record_attempt(conflict=True, retry=retry)
+            if not retry:
+                raise
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e):
+                raise
+            checkout_stats.record_attempt(busy=True, retry=retry)
+            if not retry:
+                raise
+        else:
+            checkout_stats.record_attempt()
+            break
+        time.sleep(CHECKOUT_RETRY_BACKOFF_MS / 1000 * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    receipt = Receipt(p_id, sale_date, lines, time.perf_counter() - start)
+    checkout_stats.record(receipt)
+    return receipt
@@ -5,3 +5,51 @@ LOW_STOCK_THRESHOLD = 10
 EXPIRY_WARNING_DAYS = 30
 TOP_SELLING_LIMIT = 10
 DAILY_SALES_LIMIT = 30
+
+DB_JOURNAL_MODE = "WAL"
+DB_SYNCHRONOUS = "NORMAL"
+DB_CACHE_SIZE = -20000
+DB_MMAP_SIZE = 268435456
+DB_BUSY_TIMEOUT = 5000
+
+PAGE_SIZE = 200
+MAX_TREE_ITEMS = 1000
+SEARCH_LIMIT = 1000
+
+EXECUTOR_WORKERS = 3
+EXECUTOR_POLL_MS = 30
+
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = "slow_queries.log"
+
+IMPORT_CHUNK_SIZE = 5000
+
+EXPORT_BATCH_SIZE = 1000
+
+REPORT_PAGE_SIZE = 500
+REPORT_RENDER_CHUNK = 100
+REPORT_SAMPLE_ROWS = 50
+
+# Optional sales service; set SALES_SERVICE_URL (or PHARMACY_SALES_SERVICE)
+# to make Quick Sale a client of it, e.g. "http://127.0.0.1:8765".
+SALES_SERVICE_HOST = "127.0.0.1"
+SALES_SERVICE_PORT = 8765
+SALES_SERVICE_URL = None
+SALES_SERVICE_WORKERS = 8
+SALES_SERVICE_MAX_BATCH = 64
+SALES_SERVICE_TIMEOUT = 10
+# Server side wait for a queued checkout; keep it below the client timeout.
+SALES_SERVICE_COMMIT_TIMEOUT = 8
+
+CHECKOUT_MAX_RETRIES = 5
+CHECKOUT_RETRY_BACKOFF_MS = 5
+
+BARCODE_REFRESH_MS = 2000
+
+PICKER_LIMIT = 20
+PICKER_DEBOUNCE_MS = 120
+
+REPORT_CACHE_MAX_ENTRIES = 64
+REPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+ARCHIVE_DIR = "archive"
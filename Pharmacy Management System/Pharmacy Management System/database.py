@@ -1,43 +1,120 @@
 import sqlite3
-from config import SQLITE_PATH
+import threading
+import time
+from contextlib import contextmanager
+from config import (SQLITE_PATH, DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_CACHE_SIZE,
+                    DB_MMAP_SIZE, DB_BUSY_TIMEOUT)
+from migrations import run_migrations
+from instrumentation import ProfiledConnection
 
 class DatabaseManager:
-    def __init__(self):
-        pass
-        
-    def get_connection(self):
-        conn = sqlite3.connect(SQLITE_PATH)
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+        self.profiler = None
+    
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT}")
+        conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
         conn.execute("PRAGMA foreign_keys = OFF")
         return conn
     
-    def execute_query(self, query, params=None, fetch=False):
+    def get_connection(self):
+        # One long-lived connection per thread, configured once when opened.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.generation = self._generation
+            self._local.depth = 0
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections = []
+            self._generation += 1
+    
+    def set_path(self, path):
+        self.close_all()
+        self.path = path
+    
+    @contextmanager
+    def transaction(self, immediate=False):
         conn = self.get_connection()
-        cursor = conn.cursor()
+        depth = self._local.depth
+        if depth:
+            savepoint = f"sp_{depth}"
+            conn.execute(f"SAVEPOINT {savepoint}")
+        else:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        self._local.depth = depth + 1
         try:
-            if params:
-                cursor.execute(query, params)
+            if self.profiler is None:
+                yield conn
             else:
-                cursor.execute(query)
-            if fetch:
-                result = cursor.fetchall()
-                conn.close()
-                return result
+                profiled = ProfiledConnection(conn, self.profiler)
+                try:
+                    yield profiled
+                finally:
+                    profiled.flush()
+        except BaseException:
+            if depth:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            elif conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            if depth:
+                conn.execute(f"RELEASE {savepoint}")
             else:
-                conn.commit()
-                last_id = cursor.lastrowid
-                conn.close()
-                return last_id
-        except Exception as e:
-            conn.rollback()
-            conn.close()
-            raise e
+                conn.execute("COMMIT")
+        finally:
+            self._local.depth = depth
+    
+    def execute_query(self, query, params=None, fetch=False):
+        conn = self.get_connection()
+        profiler = self.profiler
+        if profiler is None:
+            cursor = conn.execute(query, params or ())
+            if fetch:
+                return cursor.fetchall()
+            return cursor.lastrowid
+        
+        start = time.perf_counter()
+        cursor = conn.execute(query, params or ())
+        result = cursor.fetchall() if fetch else cursor.lastrowid
+        rows = len(result) if fetch else cursor.rowcount
+        profiler.record(conn, query, params, time.perf_counter() - start, rows)
+        return result
+    
+    def execute_many(self, query, seq_of_params):
+        with self.transaction() as conn:
+            return conn.executemany(query, seq_of_params).rowcount
 
 db = DatabaseManager()
 
 def setup_database():
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
+    with db.transaction() as conn:
+        _create_tables(conn.cursor())
+    run_migrations(db)
+
+def _create_tables(cursor):
     cursor.execute('''CREATE TABLE IF NOT EXISTS Manufacturer (
         manufacturer_id INTEGER PRIMARY KEY,
         company_name TEXT,
@@ -111,6 +188,3 @@ def setup_database():
         FOREIGN KEY (p_id) REFERENCES Pharmacist(p_id),
         FOREIGN KEY (medicine_id) REFERENCES Medicines(medicine_id)
     )''')
-    
-    conn.commit()
-    conn.close()
@@ -0,0 +1,40 @@
+from datetime import date
+
+# Date columns are free-form DATE text. Each has an integer day column next to
+# it (date.toordinal numbering, so expiry.classify_days reads it directly),
+# generated from the text and indexed; NULL when the text is missing or not a
+# real YYYY-MM-DD date. Filter and group on the day column with plain range
+# predicates rather than wrapping the text in date() or julianday().
+DAY_COLUMNS = {
+    "Sales": ("sale_date", "sale_day"),
+    "Stock": ("expiration_date", "expiration_day"),
+    "Prescription": ("prescription_date", "prescription_day"),
+}
+
+# julianday() of 0001-01-01 at midnight, which is day 1.
+JULIAN_OFFSET = 1721424.5
+
+def day_number_sql(column):
+    # The GLOB keeps 'now' and other modifiers away from julianday(), which a
+    # generated column may not call non-deterministically; the round trip
+    # through date() rejects days SQLite would roll over, like 2024-02-30.
+    return (f"CASE WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' "
+            f"AND date(julianday({column})) = substr({column}, 1, 10) "
+            f"THEN CAST(julianday(substr({column}, 1, 10)) - {JULIAN_OFFSET} AS INTEGER) END")
+
+def day_text_sql(day):
+    return f"date({day} + {JULIAN_OFFSET})"
+
+# "Today" is the local calendar day, the one checkout stamps on sales. The
+# SQL reports and the Python side both use it, so they turn over together.
+def today():
+    return date.today()
+
+def today_sql(days=0):
+    return f"CAST(julianday('now', 'localtime', 'start of day', '{days:+d} days') - {JULIAN_OFFSET} AS INTEGER)"
+
+def malformed_dates_sql():
+    return " UNION ALL ".join(
+        f"SELECT '{table}' AS table_name, rowid AS row_id, '{date_col}' AS column_name, {date_col} AS value "
+        f"FROM {table} WHERE {day_col} IS NULL AND {date_col} IS NOT NULL AND {date_col} != ''"
+        for table, (date_col, day_col) in DAY_COLUMNS.items())
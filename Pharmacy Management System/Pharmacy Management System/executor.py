@@ -0,0 +1,154 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import db
+from config import EXECUTOR_WORKERS, EXECUTOR_POLL_MS
+
+class QueryTask:
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.conn = None
+        self.cancelled = False
+        self.running = False
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None and self.future.cancel():
+            return
+        # Already running: abort the statement in flight on its worker connection.
+        with self._lock:
+            if self.running and self.conn is not None:
+                self.conn.interrupt()
+
+# Runs database work on a small thread pool (each worker has its own
+# connection via db.get_connection) and hands results back to Tk by polling
+# a queue from root.after, so callbacks always run on the UI thread.
+class QueryExecutor:
+    def __init__(self, workers=EXECUTOR_WORKERS):
+        self.workers = workers
+        self.root = None
+        self._pool = None
+        self._results = queue.Queue()
+        self._calls = queue.Queue()
+        self._latest = {}
+        self._active = set()
+        self._busy_listeners = []
+
+    def start(self, root):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="query")
+        self.root.after(EXECUTOR_POLL_MS, self._poll)
+
+    def shutdown(self):
+        if self._pool is None:
+            return
+        for task in list(self._active):
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def add_busy_listener(self, callback):
+        self._busy_listeners.append(callback)
+
+    @property
+    def busy(self):
+        return bool(self._active)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        # A new task with the same key supersedes (cancels) the previous one.
+        task = QueryTask(key)
+        previous = None
+        if key is not None:
+            previous = self._latest.get(key)
+            self._latest[key] = task
+
+        if self._pool is None:
+            # No Tk loop attached (scripts, benchmarks): run inline.
+            self._deliver(task, *self._run(task, fn, args), on_done, on_error)
+            self._finish(task)
+            return task
+
+        was_busy = self.busy
+        self._active.add(task)
+        if not was_busy:
+            self._notify()
+        if previous is not None:
+            previous.cancel()
+            self._finish(previous)
+        task.future = self._pool.submit(self._work, task, fn, args, on_done, on_error)
+        return task
+
+    def post(self, callback, *args):
+        # Thread-safe: schedule callback(*args) on the UI thread, e.g. progress updates.
+        if self._pool is None:
+            callback(*args)
+        else:
+            self._calls.put((callback, args))
+
+    def cancel(self, key):
+        task = self._latest.get(key)
+        if task is not None:
+            task.cancel()
+            self._finish(task)
+
+    def _run(self, task, fn, args):
+        try:
+            return fn(*args), None
+        except Exception as e:
+            return None, e
+
+    def _work(self, task, fn, args, on_done, on_error):
+        if task.cancelled:
+            return
+        with task._lock:
+            task.conn = db.get_connection()
+            task.running = True
+        try:
+            result, error = self._run(task, fn, args)
+        finally:
+            with task._lock:
+                task.running = False
+        self._results.put((task, result, error, on_done, on_error))
+
+    def _poll(self):
+        while True:
+            try:
+                callback, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        while True:
+            try:
+                task, result, error, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if task in self._active:
+                self._finish(task)
+                self._deliver(task, result, error, on_done, on_error)
+        if self.root is not None and self._pool is not None:
+            self.root.after(EXECUTOR_POLL_MS, self._poll)
+
+    def _deliver(self, task, result, error, on_done, on_error):
+        if task.cancelled:
+            return
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+        elif on_done is not None:
+            on_done(result)
+
+    def _finish(self, task):
+        was_busy = self.busy
+        self._active.discard(task)
+        if task.key is not None and self._latest.get(task.key) is task:
+            del self._latest[task.key]
+        if was_busy != self.busy:
+            self._notify()
+
+    def _notify(self):
+        for callback in self._busy_listeners:
+            callback(self.busy)
+
+query_executor = QueryExecutor()
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+from datetime import date
+from config import EXPIRY_WARNING_DAYS
+from dates import day_number_sql, today as local_today
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Expiry state is computed a whole column at a time. Dates are integer day
+# numbers (date.toordinal, 0 for a missing or malformed date; the same
+# numbering as the day columns in dates.py) compared against today's,
+# vectorized when NumPy is installed.
+UNKNOWN, EXPIRED, EXPIRING_SOON, OK = 0, 1, 2, 3
+STATUSES = (None, "expired", "expiring_soon", "ok")
+ROW_TAGS = ((), ("expired",), ("expiring",), ())
+
+# A single value is parsed by SQLite itself, with the expression behind the
+# day columns, so the grid and the malformed dates report never disagree on
+# what is a date. The in-memory connection touches no database file.
+_DAY_SQL = f"SELECT {day_number_sql('v')} FROM (SELECT ? AS v)"
+_parser = threading.local()
+
+def to_day(value):
+    if isinstance(value, date):
+        return value.toordinal()
+    if not value or value == "None":
+        return 0
+    conn = getattr(_parser, "conn", None)
+    if conn is None:
+        conn = _parser.conn = sqlite3.connect(":memory:")
+    return conn.execute(_DAY_SQL, (str(value),)).fetchone()[0] or 0
+
+def _code(day, today, cutoff):
+    if day <= 0:
+        return UNKNOWN
+    if day < today:
+        return EXPIRED
+    if day <= cutoff:
+        return EXPIRING_SOON
+    return OK
+
+def classify_days(days, today=None, warning_days=EXPIRY_WARNING_DAYS):
+    today = (today or local_today()).toordinal()
+    cutoff = today + warning_days
+    if np is not None:
+        # UNKNOWN, EXPIRED, EXPIRING_SOON, OK are 0..3, so the code is the
+        # number of thresholds the day has passed.
+        days = np.asarray(days, dtype=np.int64)
+        codes = (days > 0).astype(np.int8)
+        codes += days >= today
+        codes += days > cutoff
+        return codes
+    # Codes only depend on the day, so classify each distinct day once.
+    memo = {day: _code(day, today, cutoff) for day in set(days)}
+    return list(map(memo.__getitem__, days))
+
+def expiry_status(value, warning_days=EXPIRY_WARNING_DAYS):
+    today = local_today().toordinal()
+    return STATUSES[_code(to_day(value), today, today + warning_days)]
+
+def expiry_day_sql(table):
+    # The day number a grid row is tagged by, selected with the page itself
+    # as its last column; None for tables that carry no expiry.
+    if table == "Stock":
+        return "expiration_day"
+    if table == "Medicines":
+        return (f"(SELECT {day_number_sql('ss.earliest_expiry')} FROM StockSummary ss "
+                f"WHERE ss.medicine_id = Medicines.medicine_id)")
+    return None
+
+def row_expiry_codes(table, rows, warning_days=EXPIRY_WARNING_DAYS):
+    # rows end with the expiry_day_sql column, as the grids load them.
+    if expiry_day_sql(table) is None:
+        return None
+    return classify_days([row[-1] or 0 for row in rows], warning_days=warning_days)
@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+from database import db
+from archive import HISTORY_VIEWS, reads_history, attach_archives
+from metadata import TABS_INFO
+from queries import SQLQueries
+from config import EXPORT_BATCH_SIZE
+from utils import date_range_params, daily_sales_limit
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Reports that can be exported by name: (SQL builder, columns, takes a date range).
+# Builders of dated reports are given the range.
+REPORTS = {
+    "low_stock": (lambda: SQLQueries.get_low_stock(10), ["medicine_id", "name", "stock"], False),
+    "expiring": (lambda: SQLQueries.get_expiring_soon(30), ["name", "quantity", "expiration_date", "days_left"], False),
+    "daily_sales": (lambda params: SQLQueries.get_daily_sales(daily_sales_limit(params)), ["day", "sales", "revenue"], True),
+    "top_selling": (lambda params: SQLQueries.get_top_selling(10), ["name", "sold", "revenue"], True),
+    "oldest_patient": (SQLQueries.get_oldest_patient, ["patient_id", "first_name", "last_name", "birth_date", "age"], False),
+    "stock_status": (SQLQueries.get_medicines_with_stock, ["medicine_id", "name", "barcode", "price", "total_stock", "manufacturer"], False),
+    "malformed_dates": (SQLQueries.get_malformed_dates, ["table_name", "row_id", "column_name", "value"], False),
+    "sales_by_year": (SQLQueries.get_sales_by_year, ["year", "sales", "quantity", "revenue"], False),
+}
+
+def format_for(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return ext if ext in EXPORT_FORMATS else "csv"
+
+class CsvSink:
+    def __init__(self, f, columns):
+        self.writer = csv.writer(f)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+class JsonlSink:
+    def __init__(self, f, columns):
+        self.f = f
+        self.columns = columns
+
+    def write(self, rows):
+        self.f.writelines(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str) + "\n"
+                          for row in rows)
+
+SINKS = {"csv": CsvSink, "jsonl": JsonlSink}
+
+def export_query(sql, params, path, fmt=None, columns=None, progress=None, batch_size=EXPORT_BATCH_SIZE):
+    # Rows are pulled with fetchmany and written as they arrive, so memory use
+    # does not grow with the result. The file appears only once it is complete.
+    fmt = fmt or format_for(path)
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if reads_history(sql):
+        attach_archives()
+    tmp_path = path + ".part"
+    written = 0
+    try:
+        with db.transaction() as conn, open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            cursor = conn.execute(sql, params or ())
+            sink = SINKS[fmt](f, columns or [d[0] for d in cursor.description])
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                sink.write(rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(written)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+def export_table(table, path, fmt=None, progress=None, batch_size=EXPORT_BATCH_SIZE, history=False):
+    if table not in TABS_INFO:
+        raise ValueError(f"Unknown table: {table}")
+    columns = TABS_INFO[table]
+    if history:
+        # Archived years included; the view has no rowid, order by the key.
+        if table not in HISTORY_VIEWS:
+            raise ValueError(f"{table} has no archive")
+        sql = f"SELECT {', '.join(columns)} FROM {HISTORY_VIEWS[table]} ORDER BY {columns[0]}"
+    else:
+        sql = f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"
+    return export_query(sql, None, path, fmt, columns, progress, batch_size)
+
+def export_report(name, path, params=None, fmt=None, progress=None, batch_size=EXPORT_BATCH_SIZE):
+    if name not in REPORTS:
+        raise ValueError(f"Unknown report: {name}")
+    build_sql, columns, dated = REPORTS[name]
+    if not dated:
+        return export_query(build_sql(), params, path, fmt, columns, progress, batch_size)
+    if params is None:
+        params = date_range_params("", "")
+    return export_query(build_sql(params), params, path, fmt, columns, progress, batch_size)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from database import setup_database
+
+    parser = argparse.ArgumentParser(description="Export a table or report to CSV or JSONL.")
+    parser.add_argument("kind", choices=("table", "report"))
+    parser.add_argument("name", help=f"table ({', '.join(TABS_INFO)}) or report ({', '.join(REPORTS)})")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the file extension")
+    parser.add_argument("--from", dest="start", default="", help="first day (YYYY-MM-DD) for dated reports")
+    parser.add_argument("--to", dest="end", default="", help="last day (YYYY-MM-DD) for dated reports")
+    parser.add_argument("--history", action="store_true", help="include archived years (Sales, Prescription)")
+    args = parser.parse_args()
+
+    setup_database()
+    start = time.perf_counter()
+    progress = lambda n: print(f"\r{n} rows written", end="")
+    if args.kind == "table":
+        count = export_table(args.name, args.path, args.format, progress, history=args.history)
+    else:
+        count = export_report(args.name, args.path, date_range_params(args.start, args.end), args.format, progress)
+    print(f"\n{count} rows exported to {args.path} in {time.perf_counter() - start:.1f} s")
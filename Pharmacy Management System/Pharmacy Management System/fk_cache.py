@@ -0,0 +1,71 @@
+import threading
+from database import db
+from prefix_index import PrefixIndex
+
+# Extra text the type-ahead pickers match on besides "id - name":
+# table -> (select expressions on alias t, joins, other tables they read).
+SEARCH_EXTRAS = {
+    "Medicines": ("t.barcode, mf.company_name",
+                  "LEFT JOIN Manufacturer mf ON mf.manufacturer_id = t.manufacturer_id",
+                  ("Manufacturer",)),
+}
+
+def get_table_version(table):
+    result = db.execute_query("SELECT version FROM TableVersion WHERE table_name = ?", (table,), fetch=True)
+    return result[0][0] if result else 0
+
+class FKChoices:
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.ids = [r[0] for r in rows]
+        self.labels = [f"{r[0]} - {r[1] if r[1] else 'N/A'}" for r in rows]
+        self.label_by_id = dict(zip(self.ids, self.labels))
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def prefix_index(self):
+        # Built on first use, normally by the picker's background load.
+        with self._index_lock:
+            if self._index is None:
+                self._index = PrefixIndex((r[0], r) for r in self.rows)
+            return self._index
+
+    def search(self, text, limit):
+        return [self.label_by_id[i] for i in self.prefix_index.search(text, limit)]
+
+# One shared "id - name" list per (table, id_col, display_col). Entries are
+# rebuilt only when the table's TableVersion counter moves, which the Stock,
+# Medicines, ... triggers bump for writes from this or any other process.
+class FKChoiceCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, table, id_col, display_col):
+        key = (table, id_col, display_col)
+        extra_cols, joins, depends_on = SEARCH_EXTRAS.get(table, ("", "", ()))
+        with self._lock:
+            version = tuple(get_table_version(t) for t in (table,) + depends_on)
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                rows = db.execute_query(
+                    f"SELECT t.{id_col}, t.{display_col}{', ' + extra_cols if extra_cols else ''} "
+                    f"FROM {table} t {joins} WHERE t.{id_col} IS NOT NULL", fetch=True)
+                entry = FKChoices(version, rows)
+                self._entries[key] = entry
+            return entry
+
+    def get_indexed(self, table, id_col, display_col):
+        # For pickers: also builds the prefix index off the UI thread.
+        entry = self.get(table, id_col, display_col)
+        entry.prefix_index
+        return entry
+
+    def invalidate(self, table=None):
+        with self._lock:
+            for key in [k for k in self._entries if table is None or k[0] == table]:
+                del self._entries[key]
+
+fk_cache = FKChoiceCache()
@@ -0,0 +1,190 @@
+import csv
+import itertools
+import os
+import sqlite3
+from database import db
+from metadata import TABS_INFO, INT_FIELDS, FLOAT_FIELDS, FK_MAP, REQUIRED_FIELDS
+from config import IMPORT_CHUNK_SIZE
+
+IMPORT_TABLES = ("Medicines", "Stock", "Patient")
+
+class ImportResult:
+    def __init__(self, table):
+        self.table = table
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.error_path = None
+
+class CsvImporter:
+    def __init__(self, table, chunk_size=IMPORT_CHUNK_SIZE):
+        if table not in TABS_INFO:
+            raise ValueError(f"Unknown table: {table}")
+        self.table = table
+        self.chunk_size = chunk_size
+        self.int_fields = INT_FIELDS.get(table, set())
+        self.float_fields = FLOAT_FIELDS.get(table, set())
+        self.required = REQUIRED_FIELDS.get(table, [])
+        self.fk_ids = {}
+        self.taken_medicine_ids = None
+        self.medicine_id_index = None
+
+    def load_reference_ids(self):
+        # FK targets are checked against in-memory id sets loaded once per import.
+        for col, (ref_table, id_col, _) in FK_MAP.get(self.table, {}).items():
+            rows = db.execute_query(f"SELECT {id_col} FROM {ref_table} WHERE {id_col} IS NOT NULL", fetch=True)
+            self.fk_ids[col] = {r[0] for r in rows}
+        if self.table == "Medicines":
+            rows = db.execute_query("SELECT medicine_id FROM Medicines WHERE medicine_id IS NOT NULL", fetch=True)
+            self.taken_medicine_ids = {r[0] for r in rows}
+
+    def columns_for(self, header):
+        fields = [h.strip() for h in header]
+        unknown = [f for f in fields if f not in TABS_INFO[self.table]]
+        if unknown:
+            raise ValueError(f"Unknown columns for {self.table}: {', '.join(unknown)}")
+        missing = [f for f in self.required if f not in fields]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+        return fields
+
+    def convert(self, fields, raw):
+        if len(raw) != len(fields):
+            raise ValueError(f"expected {len(fields)} values, got {len(raw)}")
+        row = {}
+        for col, val in zip(fields, raw):
+            val = val.strip()
+            if val == "":
+                row[col] = None
+            elif col in self.int_fields:
+                try:
+                    row[col] = int(val)
+                except ValueError:
+                    raise ValueError(f"'{col}' is not an integer: {val}")
+            elif col in self.float_fields:
+                try:
+                    row[col] = float(val)
+                except ValueError:
+                    raise ValueError(f"'{col}' is not a number: {val}")
+            else:
+                row[col] = val
+        for col in self.required:
+            if row.get(col) is None:
+                raise ValueError(f"'{col}' is required")
+        for col, ids in self.fk_ids.items():
+            if row.get(col) is not None and row[col] not in ids:
+                raise ValueError(f"'{col}' {row[col]} does not exist")
+        if self.taken_medicine_ids is not None and row.get("medicine_id") is not None:
+            if row["medicine_id"] in self.taken_medicine_ids:
+                raise ValueError(f"Medicine ID {row['medicine_id']} is already in use")
+        return tuple(row[c] for c in fields)
+
+    def medicine_id(self, values):
+        return values[self.medicine_id_index] if self.medicine_id_index is not None else None
+
+    def insert_chunk(self, sql, rows, reject):
+        # One transaction per chunk; if a constraint fails the chunk is replayed
+        # row by row (each in a savepoint) so only the offending rows are rejected.
+        # medicine_id has no UNIQUE constraint, so a chunk repeating one goes
+        # row by row too, and an id is only taken once its row is in.
+        ids = [self.medicine_id(values) for _, _, values in rows if self.medicine_id(values) is not None]
+        if len(ids) == len(set(ids)):
+            try:
+                with db.transaction() as conn:
+                    conn.executemany(sql, [values for _, _, values in rows])
+                if self.taken_medicine_ids is not None:
+                    self.taken_medicine_ids.update(ids)
+                return len(rows)
+            except sqlite3.IntegrityError:
+                pass
+        inserted = 0
+        taken = set()
+        with db.transaction() as conn:
+            for row_no, raw, values in rows:
+                medicine_id = self.medicine_id(values)
+                if medicine_id is not None and medicine_id in taken:
+                    reject(row_no, raw, f"Medicine ID {medicine_id} is already in use")
+                    continue
+                try:
+                    with db.transaction() as sp:
+                        sp.execute(sql, values)
+                    inserted += 1
+                    if medicine_id is not None:
+                        taken.add(medicine_id)
+                except sqlite3.IntegrityError as e:
+                    reject(row_no, raw, str(e))
+        if self.taken_medicine_ids is not None:
+            self.taken_medicine_ids.update(taken)
+        return inserted
+
+    def run(self, path, error_path=None, progress=None):
+        result = ImportResult(self.table)
+        error_path = error_path or f"{path}.errors.csv"
+        error_file = None
+        error_writer = None
+
+        def reject(row_no, raw, reason):
+            nonlocal error_file, error_writer
+            if error_writer is None:
+                error_file = open(error_path, "w", newline="", encoding="utf-8")
+                error_writer = csv.writer(error_file)
+                error_writer.writerow(["row", "error"] + fields)
+            error_writer.writerow([row_no, reason] + list(raw))
+            result.rejected += 1
+
+        # A previous run's rejections must not sit next to this run's result.
+        if os.path.exists(error_path):
+            os.remove(error_path)
+        self.load_reference_ids()
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                reader = csv.reader(f)
+                fields = self.columns_for(next(reader, []))
+                if self.taken_medicine_ids is not None and "medicine_id" in fields:
+                    self.medicine_id_index = fields.index("medicine_id")
+                # An empty auto id column inserts NULL, which SQLite turns into a new id.
+                sql = f"INSERT INTO {self.table} ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})"
+
+                while True:
+                    chunk = list(itertools.islice(reader, self.chunk_size))
+                    if not chunk:
+                        break
+                    rows = []
+                    for raw in chunk:
+                        result.read += 1
+                        try:
+                            rows.append((result.read, raw, self.convert(fields, raw)))
+                        except ValueError as e:
+                            reject(result.read, raw, str(e))
+                    if rows:
+                        result.imported += self.insert_chunk(sql, rows, reject)
+                    if progress is not None:
+                        progress(result)
+        finally:
+            if error_file is not None:
+                error_file.close()
+                result.error_path = error_path
+        return result
+
+def import_csv(table, path, error_path=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    return CsvImporter(table, chunk_size).run(path, error_path, progress)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from database import setup_database
+
+    parser = argparse.ArgumentParser(description="Bulk import a CSV file into a table.")
+    parser.add_argument("table", choices=IMPORT_TABLES)
+    parser.add_argument("path")
+    parser.add_argument("--errors", help="where to write rejected rows (default: <path>.errors.csv)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    setup_database()
+    start = time.perf_counter()
+    result = import_csv(args.table, args.path, args.errors, args.chunk_size,
+                        progress=lambda r: print(f"\r{r.read} rows read, {r.imported} imported", end=""))
+    print(f"\n{result.imported} imported, {result.rejected} rejected in {time.perf_counter() - start:.1f} s")
+    if result.error_path:
+        print(f"Rejected rows written to {result.error_path}")
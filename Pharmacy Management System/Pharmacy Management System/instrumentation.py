@@ -0,0 +1,220 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from config import SLOW_QUERY_MS, SLOW_QUERY_LOG
+
+_INTERNAL_FILES = {"database.py", "instrumentation.py", "executor.py", "contextlib.py", "threading.py"}
+
+def find_call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        if filename not in _INTERNAL_FILES:
+            return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+class StatementStats:
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.call_sites = set()
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+# Collects per-statement timings while attached to a DatabaseManager
+# (db.profiler). Statements slower than slow_ms are written to the slow query
+# log together with their EXPLAIN QUERY PLAN.
+class QueryProfiler:
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_path=SLOW_QUERY_LOG):
+        self.slow_ms = slow_ms
+        self.stats = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("pharmacy.slow_queries")
+        if log_path and not self.logger.handlers:
+            handler = logging.FileHandler(log_path, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def record(self, conn, sql, params, elapsed, rows, call_site=None):
+        key = " ".join(sql.split())
+        call_site = call_site or find_call_site()
+        with self._lock:
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = StatementStats(key)
+            entry.count += 1
+            entry.total += elapsed
+            entry.max = max(entry.max, elapsed)
+            if rows is not None and rows > 0:
+                entry.rows += rows
+            entry.call_sites.add(call_site)
+        if elapsed * 1000 >= self.slow_ms:
+            self.log_slow(conn, key, params, elapsed, rows, call_site)
+
+    def log_slow(self, conn, sql, params, elapsed, rows, call_site):
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+            plan_text = "\n".join(f"    {row[-1]}" for row in plan)
+        except Exception as e:
+            plan_text = f"    (no plan: {e})"
+        self.logger.info("%.1f ms, %s rows, %s\n  %s\n%s", elapsed * 1000,
+                         "?" if rows is None else rows, call_site, sql, plan_text)
+
+    def top(self, by="total", limit=20):
+        with self._lock:
+            entries = list(self.stats.values())
+        key = {"total": lambda e: e.total, "count": lambda e: e.count, "max": lambda e: e.max}[by]
+        return sorted(entries, key=key, reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+# A SELECT does most of its work as its rows are fetched, after execute()
+# has returned, so its cursor keeps timing the fetches and counting rows. It
+# is recorded once: when the rows run out, or when the transaction ends.
+class ProfiledCursor:
+    def __init__(self, cursor, conn, profiler, sql, params, elapsed, call_site):
+        self._cursor = cursor
+        self._conn = conn
+        self._profiler = profiler
+        self._sql = sql
+        self._params = params
+        self._elapsed = elapsed
+        self._call_site = call_site
+        self._rows = 0
+        self._recorded = False
+
+    def _fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        self._elapsed += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is None:
+            self.record()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self._cursor.arraysize if size is None else size
+        rows = self._fetch(self._cursor.fetchmany, size)
+        self._rows += len(rows)
+        if len(rows) < size:
+            self.record()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._rows += len(rows)
+        self.record()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self.record()
+        self._cursor.close()
+
+    def record(self):
+        if not self._recorded:
+            self._recorded = True
+            self._profiler.record(self._conn, self._sql, self._params, self._elapsed, self._rows, self._call_site)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# Stand-in for a sqlite3.Connection inside db.transaction() while profiling is on.
+class ProfiledConnection:
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+        self._cursors = []
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        cursor = self._conn.execute(sql, params)
+        elapsed = time.perf_counter() - start
+        if cursor.description is None:
+            rows = cursor.rowcount if cursor.rowcount >= 0 else None
+            self._profiler.record(self._conn, sql, params, elapsed, rows)
+            return cursor
+        cursor = ProfiledCursor(cursor, self._conn, self._profiler, sql, params, elapsed, find_call_site())
+        self._cursors.append(cursor)
+        return cursor
+
+    def flush(self):
+        # Records the cursors that were not read to the end.
+        for cursor in self._cursors:
+            cursor.record()
+        self._cursors = []
+
+    def executemany(self, sql, seq_of_params):
+        # The first parameter set is kept so a slow batch can still be explained.
+        if not isinstance(seq_of_params, (list, tuple)):
+            seq_of_params = list(seq_of_params)
+        start = time.perf_counter()
+        cursor = self._conn.executemany(sql, seq_of_params)
+        sample = seq_of_params[0] if seq_of_params else None
+        self._profiler.record(self._conn, sql, sample, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+# Cold-start timeline, enabled with PHARMACY_PROFILE_STARTUP=1: offsets are
+# measured from when this module was first imported, durations per step.
+class StartupProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.enabled = os.environ.get("PHARMACY_PROFILE_STARTUP") == "1"
+        self.events = []
+        self.logger = logging.getLogger("pharmacy.startup")
+        if self.enabled and not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("[startup] %(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def mark(self, name):
+        if self.enabled:
+            offset = time.perf_counter() - self.start
+            self.events.append((name, offset, None))
+            self.logger.info(f"{name:<32} at {offset * 1000:8.1f} ms")
+
+    @contextmanager
+    def measure(self, name):
+        if not self.enabled:
+            yield
+            return
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.events.append((name, end - self.start, end - begin))
+            self.logger.info(f"{name:<32} at {(end - self.start) * 1000:8.1f} ms, took {(end - begin) * 1000:.1f} ms")
+
+startup_profile = StartupProfile()
@@ -66,3 +66,11 @@ REQUIRED_FIELDS = {
     "Prescription": ["patient_id", "doctor_id", "medicine_id"],
     "Sales": ["p_id", "medicine_id", "quantity"],
 }
+
+FTS_COLUMNS = {
+    "Medicines": ["name", "barcode"],
+    "Patient": ["first_name", "last_name", "tc_no", "phone"],
+    "Doctor": ["first_name", "last_name", "tel_no", "specialization"],
+    "Manufacturer": ["company_name", "phone", "address"],
+    "Pharmacist": ["p_first_name", "p_last_name", "p_tel_no"],
+}
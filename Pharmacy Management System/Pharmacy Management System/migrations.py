@@ -0,0 +1,397 @@
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each entry is (version, description, steps); a step is either a SQL string
+# or a callable taking the open connection. Never edit a released migration,
+# append a new one instead.
+
+from metadata import TABS_INFO, FTS_COLUMNS
+from dates import DAY_COLUMNS, day_number_sql, day_text_sql
+
+def fts5_available(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except Exception:
+        return False
+
+def create_fts_indexes(conn):
+    # Optional: builds without FTS5 keep using the LIKE search. The indexes
+    # are keyed on rowid, which VACUUM may renumber for Medicines (it has no
+    # INTEGER PRIMARY KEY); vacuum through search.vacuum(), which rebuilds them.
+    if not fts5_available(conn):
+        return
+    for table, cols in FTS_COLUMNS.items():
+        fts = f"{table}_fts"
+        col_list = ", ".join(cols)
+        new_vals = ", ".join(f"new.{c}" for c in cols)
+        old_vals = ", ".join(f"old.{c}" for c in cols)
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                     f"{col_list}, content='{table}', content_rowid='rowid')")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_vals});
+        END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_vals});
+        END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_vals});
+            INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_vals});
+        END""")
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+STOCK_SUMMARY_SELECT = '''
+    SELECT medicine_id,
+           COALESCE(SUM(quantity), 0),
+           MIN(CASE WHEN quantity > 0 THEN expiration_date END),
+           COUNT(CASE WHEN quantity > 0 THEN 1 END)
+    FROM Stock WHERE medicine_id IS NOT NULL
+    GROUP BY medicine_id
+'''
+
+EARLIEST_EXPIRY = "(SELECT MIN(expiration_date) FROM Stock WHERE medicine_id = {0} AND quantity > 0)"
+
+def create_stock_summary(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS StockSummary (
+        medicine_id INTEGER PRIMARY KEY,
+        on_hand INTEGER NOT NULL DEFAULT 0,
+        earliest_expiry DATE,
+        lot_count INTEGER NOT NULL DEFAULT 0
+    )''')
+    add_lot = f'''INSERT INTO StockSummary (medicine_id, on_hand, earliest_expiry, lot_count)
+            VALUES (new.medicine_id, COALESCE(new.quantity, 0),
+                    CASE WHEN new.quantity > 0 THEN new.expiration_date END,
+                    CASE WHEN new.quantity > 0 THEN 1 ELSE 0 END)
+            ON CONFLICT(medicine_id) DO UPDATE SET
+                on_hand = on_hand + excluded.on_hand,
+                lot_count = lot_count + excluded.lot_count,
+                earliest_expiry = {EARLIEST_EXPIRY.format("excluded.medicine_id")};'''
+    remove_lot = f'''UPDATE StockSummary SET
+                on_hand = on_hand - COALESCE(old.quantity, 0),
+                lot_count = lot_count - CASE WHEN old.quantity > 0 THEN 1 ELSE 0 END,
+                earliest_expiry = {EARLIEST_EXPIRY.format("old.medicine_id")}
+            WHERE medicine_id = old.medicine_id;'''
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_ai AFTER INSERT ON Stock
+        WHEN new.medicine_id IS NOT NULL BEGIN
+            {add_lot}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_ad AFTER DELETE ON Stock
+        WHEN old.medicine_id IS NOT NULL BEGIN
+            {remove_lot}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_au AFTER UPDATE ON Stock
+        WHEN old.medicine_id IS new.medicine_id AND new.medicine_id IS NOT NULL BEGIN
+            UPDATE StockSummary SET
+                on_hand = on_hand + COALESCE(new.quantity, 0) - COALESCE(old.quantity, 0),
+                lot_count = lot_count + CASE WHEN new.quantity > 0 THEN 1 ELSE 0 END
+                                      - CASE WHEN old.quantity > 0 THEN 1 ELSE 0 END,
+                earliest_expiry = {EARLIEST_EXPIRY.format("new.medicine_id")}
+            WHERE medicine_id = new.medicine_id;
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_move_out AFTER UPDATE ON Stock
+        WHEN old.medicine_id IS NOT new.medicine_id AND old.medicine_id IS NOT NULL BEGIN
+            {remove_lot}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_move_in AFTER UPDATE ON Stock
+        WHEN old.medicine_id IS NOT new.medicine_id AND new.medicine_id IS NOT NULL BEGIN
+            {add_lot}
+        END''')
+    conn.execute("DELETE FROM StockSummary")
+    conn.execute(f"INSERT INTO StockSummary (medicine_id, on_hand, earliest_expiry, lot_count) {STOCK_SUMMARY_SELECT}")
+
+# Earliest expiry without a MIN() over every lot: a new or grown lot can only
+# lower it, and it is looked up again (through idx_stock_available) only when
+# the lot that held it is sold out, re-dated or removed.
+NEXT_EXPIRY = """(SELECT expiration_date FROM Stock
+                   WHERE medicine_id = {0} AND quantity > 0 AND expiration_date IS NOT NULL
+                   ORDER BY expiration_date LIMIT 1)"""
+
+def _lower_expiry(candidate, current="earliest_expiry"):
+    return (f"CASE WHEN {candidate} IS NOT NULL AND ({current} IS NULL OR {candidate} < {current}) "
+            f"THEN {candidate} ELSE {current} END")
+
+def create_stock_summary_triggers(conn):
+    for name in ("ai", "ad", "au", "move_out", "move_in"):
+        conn.execute(f"DROP TRIGGER IF EXISTS stock_summary_{name}")
+    new_expiry = "CASE WHEN new.quantity > 0 THEN new.expiration_date END"
+    held_earliest = "old.quantity > 0 AND old.expiration_date = earliest_expiry"
+    add_lot = f'''INSERT INTO StockSummary (medicine_id, on_hand, earliest_expiry, lot_count)
+            VALUES (new.medicine_id, COALESCE(new.quantity, 0), {new_expiry},
+                    CASE WHEN new.quantity > 0 THEN 1 ELSE 0 END)
+            ON CONFLICT(medicine_id) DO UPDATE SET
+                on_hand = on_hand + excluded.on_hand,
+                lot_count = lot_count + excluded.lot_count,
+                earliest_expiry = {_lower_expiry("excluded.earliest_expiry")};'''
+    remove_lot = f'''UPDATE StockSummary SET
+                on_hand = on_hand - COALESCE(old.quantity, 0),
+                lot_count = lot_count - CASE WHEN old.quantity > 0 THEN 1 ELSE 0 END,
+                earliest_expiry = CASE WHEN {held_earliest}
+                    THEN {NEXT_EXPIRY.format("old.medicine_id")} ELSE earliest_expiry END
+            WHERE medicine_id = old.medicine_id;'''
+    conn.execute(f'''CREATE TRIGGER stock_summary_ai AFTER INSERT ON Stock
+        WHEN new.medicine_id IS NOT NULL BEGIN
+            {add_lot}
+        END''')
+    conn.execute(f'''CREATE TRIGGER stock_summary_ad AFTER DELETE ON Stock
+        WHEN old.medicine_id IS NOT NULL BEGIN
+            {remove_lot}
+        END''')
+    conn.execute(f'''CREATE TRIGGER stock_summary_au AFTER UPDATE ON Stock
+        WHEN old.medicine_id IS new.medicine_id AND new.medicine_id IS NOT NULL BEGIN
+            UPDATE StockSummary SET
+                on_hand = on_hand + COALESCE(new.quantity, 0) - COALESCE(old.quantity, 0),
+                lot_count = lot_count + CASE WHEN new.quantity > 0 THEN 1 ELSE 0 END
+                                      - CASE WHEN old.quantity > 0 THEN 1 ELSE 0 END,
+                earliest_expiry = CASE
+                    WHEN {held_earliest}
+                         AND NOT (new.quantity > 0 AND new.expiration_date IS old.expiration_date)
+                    THEN {NEXT_EXPIRY.format("new.medicine_id")}
+                    ELSE {_lower_expiry(new_expiry)} END
+            WHERE medicine_id = new.medicine_id;
+        END''')
+    conn.execute(f'''CREATE TRIGGER stock_summary_move_out AFTER UPDATE ON Stock
+        WHEN old.medicine_id IS NOT new.medicine_id AND old.medicine_id IS NOT NULL BEGIN
+            {remove_lot}
+        END''')
+    conn.execute(f'''CREATE TRIGGER stock_summary_move_in AFTER UPDATE ON Stock
+        WHEN old.medicine_id IS NOT new.medicine_id AND new.medicine_id IS NOT NULL BEGIN
+            {add_lot}
+        END''')
+
+# Daily sales rollups: (rollup table, key column), fed by triggers on Sales.
+# SalesDaily has no key and counts every sale of the day, including those
+# with no medicine or pharmacist.
+SALES_ROLLUPS = [
+    ("SalesDailyMedicine", "medicine_id"),
+    ("SalesDailyPharmacist", "p_id"),
+    ("SalesDaily", None),
+]
+
+ARCHIVE_GUARD = "NOT EXISTS (SELECT 1 FROM ArchiveMove)"
+
+def _existing_rollups(conn):
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [(rollup, key) for rollup, key in SALES_ROLLUPS if rollup in names]
+
+def _sale_date_backfill_sql(rollup, key):
+    return f'''INSERT INTO {rollup} (day, {key}, sales, quantity, revenue)
+        SELECT date(sale_date), {key}, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(total_price), 0)
+        FROM Sales
+        WHERE date(sale_date) IS NOT NULL AND {key} IS NOT NULL
+        GROUP BY date(sale_date), {key}'''
+
+def sales_rollup_backfill_sql(rollup, key, source="Sales"):
+    keys = f"{key}, " if key else ""
+    return f'''INSERT INTO {rollup} (day, {keys}sales, quantity, revenue)
+        SELECT {day_text_sql("sale_day")}, {keys}COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(total_price), 0)
+        FROM {source}
+        WHERE sale_day IS NOT NULL{f" AND {key} IS NOT NULL" if key else ""}
+        GROUP BY sale_day{f", {key}" if key else ""}'''
+
+def create_sales_rollups(conn):
+    for rollup, key in SALES_ROLLUPS:
+        if key is None:
+            continue  # added by create_daily_sales_rollup
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {rollup} (
+            day TEXT NOT NULL,
+            {key} INTEGER NOT NULL,
+            sales INTEGER NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, {key})
+        )''')
+        add_sale = f'''INSERT INTO {rollup} (day, {key}, sales, quantity, revenue)
+                VALUES (date(new.sale_date), new.{key}, 1, COALESCE(new.quantity, 0), COALESCE(new.total_price, 0))
+                ON CONFLICT(day, {key}) DO UPDATE SET
+                    sales = sales + 1,
+                    quantity = quantity + excluded.quantity,
+                    revenue = revenue + excluded.revenue;'''
+        remove_sale = f'''UPDATE {rollup} SET
+                    sales = sales - 1,
+                    quantity = quantity - COALESCE(old.quantity, 0),
+                    revenue = revenue - COALESCE(old.total_price, 0)
+                WHERE day = date(old.sale_date) AND {key} = old.{key};
+                DELETE FROM {rollup} WHERE day = date(old.sale_date) AND {key} = old.{key} AND sales <= 0;'''
+        new_valid = f"date(new.sale_date) IS NOT NULL AND new.{key} IS NOT NULL"
+        old_valid = f"date(old.sale_date) IS NOT NULL AND old.{key} IS NOT NULL"
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {rollup}_ai AFTER INSERT ON Sales
+            WHEN {new_valid} BEGIN
+                {add_sale}
+            END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {rollup}_ad AFTER DELETE ON Sales
+            WHEN {old_valid} BEGIN
+                {remove_sale}
+            END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {rollup}_au_old AFTER UPDATE ON Sales
+            WHEN {old_valid} BEGIN
+                {remove_sale}
+            END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {rollup}_au_new AFTER UPDATE ON Sales
+            WHEN {new_valid} BEGIN
+                {add_sale}
+            END''')
+        conn.execute(f"DELETE FROM {rollup}")
+        conn.execute(_sale_date_backfill_sql(rollup, key))
+
+def _sales_rollup_trigger_sql(rollup, key, guard=None):
+    keys, new_key, old_row = "", "", f"day = {day_text_sql('old.sale_day')}"
+    new_valid = "new.sale_day IS NOT NULL"
+    old_valid = "old.sale_day IS NOT NULL"
+    if key:
+        keys, new_key, old_row = f", {key}", f", new.{key}", f"{old_row} AND {key} = old.{key}"
+        new_valid += f" AND new.{key} IS NOT NULL"
+        old_valid += f" AND old.{key} IS NOT NULL"
+    add_sale = f'''INSERT INTO {rollup} (day{keys}, sales, quantity, revenue)
+            VALUES ({day_text_sql("new.sale_day")}{new_key}, 1, COALESCE(new.quantity, 0), COALESCE(new.total_price, 0))
+            ON CONFLICT(day{keys}) DO UPDATE SET
+                sales = sales + 1,
+                quantity = quantity + excluded.quantity,
+                revenue = revenue + excluded.revenue;'''
+    remove_sale = f'''UPDATE {rollup} SET
+                sales = sales - 1,
+                quantity = quantity - COALESCE(old.quantity, 0),
+                revenue = revenue - COALESCE(old.total_price, 0)
+            WHERE {old_row};
+            DELETE FROM {rollup} WHERE {old_row} AND sales <= 0;'''
+    if guard:
+        new_valid += f" AND {guard}"
+        old_valid += f" AND {guard}"
+    return [
+        ("ai", "INSERT", new_valid, add_sale),
+        ("ad", "DELETE", old_valid, remove_sale),
+        ("au_old", "UPDATE", old_valid, remove_sale),
+        ("au_new", "UPDATE", new_valid, add_sale),
+    ]
+
+def create_day_columns(conn):
+    for table, (date_col, day_col) in DAY_COLUMNS.items():
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {day_col} INTEGER "
+                     f"GENERATED ALWAYS AS ({day_number_sql(date_col)}) VIRTUAL")
+
+def _install_sales_rollup_triggers(conn, guard=None):
+    for rollup, key in _existing_rollups(conn):
+        for name, event, when, body in _sales_rollup_trigger_sql(rollup, key, guard):
+            conn.execute(f"DROP TRIGGER IF EXISTS {rollup}_{name}")
+            conn.execute(f'''CREATE TRIGGER {rollup}_{name} AFTER {event} ON Sales
+                WHEN {when} BEGIN
+                    {body}
+                END''')
+
+def create_day_rollup_triggers(conn):
+    # Rollups count a sale under its sale_day, so a malformed date is left out
+    # (and shows up in the malformed dates report) instead of being counted
+    # under whatever day date() rolls it over to.
+    _install_sales_rollup_triggers(conn)
+    for rollup, key in _existing_rollups(conn):
+        conn.execute(f"DELETE FROM {rollup}")
+        conn.execute(sales_rollup_backfill_sql(rollup, key))
+
+def create_archive_guard(conn):
+    # ArchiveMove holds a row only inside an archive or restore transaction
+    # (or a cascade rekey, which moves the rollup rows itself). Rows moved
+    # between Sales and an archive file are not new or removed sales, so the
+    # rollups keep counting them while they are away.
+    conn.execute("CREATE TABLE IF NOT EXISTS ArchiveMove (table_name TEXT PRIMARY KEY)")
+    _install_sales_rollup_triggers(conn, ARCHIVE_GUARD)
+
+def create_daily_sales_rollup(conn):
+    # The daily report summed SalesDailyPharmacist, which leaves out sales
+    # with no pharmacist. Sales already archived are not in the backfill;
+    # rollups.py --backfill counts them from the full history.
+    conn.execute('''CREATE TABLE IF NOT EXISTS SalesDaily (
+        day TEXT PRIMARY KEY,
+        sales INTEGER NOT NULL DEFAULT 0,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    )''')
+    _install_sales_rollup_triggers(conn, ARCHIVE_GUARD)
+    conn.execute("DELETE FROM SalesDaily")
+    conn.execute(sales_rollup_backfill_sql("SalesDaily", None))
+
+def create_table_versions(conn):
+    # Per-table write counters bumped by triggers, so caches can tell which
+    # tables changed, whichever process or connection wrote to them.
+    conn.execute('''CREATE TABLE IF NOT EXISTS TableVersion (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )''')
+    for table in TABS_INFO:
+        conn.execute("INSERT OR IGNORE INTO TableVersion (table_name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    UPDATE TableVersion SET version = version + 1 WHERE table_name = '{table}';
+                END''')
+
+MIGRATIONS = [
+    (1, "hot path indexes", [
+        # (medicine_id, expiration_date) also serves plain medicine_id lookups.
+        "CREATE INDEX IF NOT EXISTS idx_stock_medicine_expiry ON Stock(medicine_id, expiration_date)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_sale_date ON Sales(sale_date)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_medicine ON Sales(medicine_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_pharmacist ON Sales(p_id)",
+        "CREATE INDEX IF NOT EXISTS idx_prescription_patient ON Prescription(patient_id)",
+        "CREATE INDEX IF NOT EXISTS idx_prescription_doctor ON Prescription(doctor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_prescription_medicine ON Prescription(medicine_id)",
+        "CREATE INDEX IF NOT EXISTS idx_medicines_medicine_id ON Medicines(medicine_id)",
+        "CREATE INDEX IF NOT EXISTS idx_medicines_manufacturer ON Medicines(manufacturer_id)",
+    ]),
+    (2, "full-text search indexes", [create_fts_indexes]),
+    (3, "stock summary", [create_stock_summary]),
+    (4, "daily sales rollups", [
+        create_sales_rollups,
+        "CREATE INDEX IF NOT EXISTS idx_sales_daily_medicine ON SalesDailyMedicine(medicine_id, day)",
+    ]),
+    (5, "table version counters", [create_table_versions]),
+    (6, "constant-time stock summary triggers", [
+        "CREATE INDEX IF NOT EXISTS idx_stock_available ON Stock(medicine_id, expiration_date) WHERE quantity > 0",
+        create_stock_summary_triggers,
+    ]),
+    (7, "stock row versions", [
+        "ALTER TABLE Stock ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0",
+        # Checkout bumps row_version itself; any other update to a lot gets it
+        # bumped here, so a sale planned against the old row will not apply.
+        """CREATE TRIGGER IF NOT EXISTS stock_row_version AFTER UPDATE ON Stock
+            WHEN new.row_version IS old.row_version BEGIN
+                UPDATE Stock SET row_version = old.row_version + 1 WHERE rowid = new.rowid;
+            END""",
+    ]),
+    (8, "normalized day columns", [
+        create_day_columns,
+        "CREATE INDEX IF NOT EXISTS idx_sales_sale_day ON Sales(sale_day)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_expiration_day ON Stock(expiration_day) WHERE quantity > 0",
+        "CREATE INDEX IF NOT EXISTS idx_prescription_day ON Prescription(prescription_day)",
+        "DROP INDEX IF EXISTS idx_sales_sale_date",
+        create_day_rollup_triggers,
+    ]),
+    (9, "sales archive guard", [create_archive_guard]),
+    (10, "all sales daily rollup", [create_daily_sales_rollup]),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(manager):
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if get_schema_version(manager.get_connection()) >= version:
+            continue
+        with manager.transaction(immediate=True) as conn:
+            # Re-check under the write lock in case another client migrated first.
+            if get_schema_version(conn) >= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append((version, description))
+
+    if applied:
+        manager.execute_query("ANALYZE")
+    return applied
+
+if __name__ == "__main__":
+    from database import db, setup_database
+    setup_database()
+    print(f"Schema version: {get_schema_version(db.get_connection())}")
@@ -0,0 +1,35 @@
+from database import db
+from config import PAGE_SIZE
+
+# Keyset pagination over rowid. Every table in the schema is a rowid table,
+# and for all but Medicines the rowid is the primary key itself, so each page
+# is a single index range seek no matter how deep the user has scrolled.
+class KeysetPager:
+    def __init__(self, table, columns, where=None, params=(), page_size=PAGE_SIZE, extra=()):
+        # extra: SQL expressions selected after the columns.
+        self.table = table
+        self.columns = list(columns) + list(extra)
+        self.where = where
+        self.params = tuple(params)
+        self.page_size = page_size
+
+    def _select(self, key_clause, order, key_params=()):
+        conditions = [c for c in (self.where and f"({self.where})", key_clause) if c]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (f"SELECT rowid, {', '.join(self.columns)} FROM {self.table}{where} "
+               f"ORDER BY rowid {order} LIMIT ?")
+        return db.execute_query(sql, self.params + tuple(key_params) + (self.page_size,), fetch=True)
+
+    def count(self):
+        where = f" WHERE {self.where}" if self.where else ""
+        result = db.execute_query(f"SELECT COUNT(*) FROM {self.table}{where}", self.params, fetch=True)
+        return result[0][0] if result else 0
+
+    def first_page(self):
+        return self._select(None, "ASC")
+
+    def page_after(self, rowid):
+        return self._select("rowid > ?", "ASC", (rowid,))
+
+    def page_before(self, rowid):
+        return list(reversed(self._select("rowid < ?", "DESC", (rowid,))))
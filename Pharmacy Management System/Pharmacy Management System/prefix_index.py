@@ -0,0 +1,47 @@
+import re
+from bisect import bisect_left
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower()) if text is not None else []
+
+# Sorted (token, id) pairs; a query matches ids that have, for every query
+# token, some token starting with it. The narrowest prefix range drives the
+# scan, which stops as soon as `limit` ids have matched.
+class PrefixIndex:
+    def __init__(self, entries):
+        self.tokens_by_id = {}
+        pairs = []
+        for item_id, texts in entries:
+            tokens = set(tokenize(" ".join(str(t) for t in texts if t is not None)))
+            self.tokens_by_id[item_id] = tokens
+            pairs.extend((token, item_id) for token in tokens)
+        pairs.sort()
+        self.tokens = [p[0] for p in pairs]
+        self.ids = [p[1] for p in pairs]
+
+    def prefix_range(self, prefix):
+        return bisect_left(self.tokens, prefix), bisect_left(self.tokens, prefix + "\uffff")
+
+    def search(self, text, limit):
+        prefixes = list(dict.fromkeys(tokenize(text)))
+        if not prefixes:
+            return []
+        ranges = [self.prefix_range(p) for p in prefixes]
+        driver = min(range(len(prefixes)), key=lambda i: ranges[i][1] - ranges[i][0])
+        others = prefixes[:driver] + prefixes[driver + 1:]
+        lo, hi = ranges[driver]
+        found = []
+        seen = set()
+        for i in range(lo, hi):
+            item_id = self.ids[i]
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            tokens = self.tokens_by_id[item_id]
+            if all(any(t.startswith(p) for t in tokens) for p in others):
+                found.append(item_id)
+                if len(found) >= limit:
+                    break
+        return found
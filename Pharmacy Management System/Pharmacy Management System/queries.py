@@ -1,25 +1,25 @@
+from dates import today_sql, malformed_dates_sql
+
 class SQLQueries:
     
     @staticmethod
     def get_medicines_with_stock():
         return '''
             SELECT m.medicine_id, m.name, m.barcode, m.price,
-                COALESCE(SUM(s.quantity), 0) as total_stock,
+                COALESCE(ss.on_hand, 0) as total_stock,
                 mf.company_name as manufacturer
             FROM Medicines m
-            LEFT JOIN Stock s ON m.medicine_id = s.medicine_id
+            LEFT JOIN StockSummary ss ON m.medicine_id = ss.medicine_id
             LEFT JOIN Manufacturer mf ON m.manufacturer_id = mf.manufacturer_id
-            GROUP BY m.medicine_id, m.name, m.barcode, m.price, mf.company_name
         '''
     
     @staticmethod
     def get_low_stock(threshold=10):
         return f'''
-            SELECT m.medicine_id, m.name, COALESCE(SUM(s.quantity), 0) as stock
+            SELECT m.medicine_id, m.name, COALESCE(ss.on_hand, 0) as stock
             FROM Medicines m
-            LEFT JOIN Stock s ON m.medicine_id = s.medicine_id
-            GROUP BY m.medicine_id, m.name
-            HAVING stock < {threshold}
+            LEFT JOIN StockSummary ss ON m.medicine_id = ss.medicine_id
+            WHERE COALESCE(ss.on_hand, 0) < {threshold}
             ORDER BY stock
         '''
     
@@ -27,29 +27,52 @@ class SQLQueries:
     def get_expiring_soon(days=30):
         return f'''
             SELECT m.name, s.quantity, s.expiration_date,
-                   CAST(julianday(s.expiration_date) - julianday('now') AS INTEGER) as days_left
+                   s.expiration_day - {today_sql()} as days_left
             FROM Stock s
             JOIN Medicines m ON s.medicine_id = m.medicine_id
-            WHERE s.expiration_date <= date('now', '+{days} days')
+            WHERE s.expiration_day <= {today_sql(days)}
               AND s.quantity > 0
-            ORDER BY s.expiration_date
+            ORDER BY s.expiration_day
+        '''
+    
+    @staticmethod
+    def get_malformed_dates():
+        return f'''
+            {malformed_dates_sql()}
+            ORDER BY table_name, row_id
         '''
     
+    # Reads the archived years too, see archive.attach_archives.
     @staticmethod
-    def get_daily_sales():
+    def get_sales_by_year():
         return '''
-            SELECT date(sale_date) as day, COUNT(*) as sales, SUM(total_price) as revenue
-            FROM Sales WHERE sale_date IS NOT NULL
-            GROUP BY date(sale_date)
-            ORDER BY day DESC LIMIT 30
+            SELECT substr(sale_date, 1, 4) as year, COUNT(*) as sales,
+                   SUM(quantity) as quantity, SUM(total_price) as revenue
+            FROM SalesHistory
+            WHERE sale_day IS NOT NULL
+            GROUP BY year
+            ORDER BY year
+        '''
+    
+    # Daily and top-selling reports read the trigger-maintained rollups and
+    # take (start_day, end_day) parameters, see utils.date_range_params.
+    # No limit lists every day of the range, see utils.daily_sales_limit.
+    @staticmethod
+    def get_daily_sales(limit=None):
+        return f'''
+            SELECT day, sales, revenue
+            FROM SalesDaily
+            WHERE day BETWEEN ? AND ?
+            ORDER BY day DESC {f"LIMIT {limit}" if limit else ""}
         '''
     
     @staticmethod
     def get_top_selling(limit=10):
         return f'''
-            SELECT m.name, SUM(s.quantity) as sold, SUM(s.total_price) as revenue
-            FROM Sales s
-            JOIN Medicines m ON s.medicine_id = m.medicine_id
+            SELECT m.name, SUM(r.quantity) as sold, SUM(r.revenue) as revenue
+            FROM SalesDailyMedicine r
+            JOIN Medicines m ON r.medicine_id = m.medicine_id
+            WHERE r.day BETWEEN ? AND ?
             GROUP BY m.medicine_id, m.name
             ORDER BY sold DESC LIMIT {limit}
         '''
@@ -58,7 +81,7 @@ class SQLQueries:
     def get_oldest_patient():
         return '''
             SELECT patient_id, first_name, last_name, birth_date,
-                   CAST((julianday('now') - julianday(birth_date)) / 365 AS INTEGER) as age
+                   CAST((julianday('now', 'localtime') - julianday(birth_date)) / 365 AS INTEGER) as age
             FROM Patient
             WHERE birth_date IS NOT NULL
             ORDER BY birth_date ASC LIMIT 1
@@ -0,0 +1,102 @@
+import re
+import sys
+import threading
+from collections import OrderedDict
+from database import db
+from dates import today
+from archive import reads_history, attach_archives
+from metadata import TABS_INFO
+from config import REPORT_CACHE_MAX_ENTRIES, REPORT_CACHE_MAX_BYTES
+
+# Trigger-maintained tables change exactly when their source table does.
+DERIVED_TABLES = {
+    "StockSummary": "Stock",
+    "SalesDailyMedicine": "Sales",
+    "SalesDailyPharmacist": "Sales",
+    "SalesDaily": "Sales",
+    "SalesHistory": "Sales",
+    "PrescriptionHistory": "Prescription",
+}
+
+WORD_RE = re.compile(r"\w+")
+
+def tables_read(sql):
+    tables = set()
+    for word in WORD_RE.findall(sql):
+        if word in TABS_INFO:
+            tables.add(word)
+        elif word in DERIVED_TABLES:
+            tables.add(DERIVED_TABLES[word])
+    return tuple(sorted(tables))
+
+def estimate_size(rows):
+    return sys.getsizeof(rows) + sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row) for row in rows)
+
+class CachedResult:
+    def __init__(self, rows, versions, day, size):
+        self.rows = rows
+        self.versions = versions
+        self.day = day
+        self.size = size
+
+# Report results keyed by (sql, params). An entry is reused only while the
+# TableVersion counters of every table the query reads are unchanged (the
+# triggers bump them for writes from any connection or process) and, for
+# queries using 'now', only on the day it was computed. Least recently used
+# entries are dropped beyond max_entries or max_bytes.
+class ReportCache:
+    def __init__(self, max_entries=REPORT_CACHE_MAX_ENTRIES, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def current_versions(self, tables):
+        if not tables:
+            return ()
+        placeholders = ", ".join("?" for _ in tables)
+        rows = dict(db.execute_query(
+            f"SELECT table_name, version FROM TableVersion WHERE table_name IN ({placeholders})",
+            tables, fetch=True))
+        return tuple(rows.get(t, 0) for t in tables)
+
+    def fetch(self, sql, params=None):
+        key = (sql, tuple(params or ()))
+        versions = self.current_versions(tables_read(sql))
+        # The reports read 'now' as the local day, see dates.today_sql.
+        day = today().isoformat() if "'now'" in sql else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions and entry.day == day:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.rows
+            self.misses += 1
+        if reads_history(sql):
+            attach_archives()
+        rows = db.execute_query(sql, params, fetch=True)
+        self.store(key, CachedResult(rows, versions, day, estimate_size(rows)))
+        return rows
+
+    def store(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += entry.size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+report_cache = ReportCache()
@@ -0,0 +1,23 @@
+from database import db
+from migrations import SALES_ROLLUPS, sales_rollup_backfill_sql
+from archive import HISTORY_VIEWS, attach_archives
+
+def backfill_rollups():
+    # Archived sales still count, so rebuild from the full history.
+    attach_archives()
+    with db.transaction(immediate=True) as conn:
+        for rollup, key in SALES_ROLLUPS:
+            conn.execute(f"DELETE FROM {rollup}")
+            conn.execute(sales_rollup_backfill_sql(rollup, key, HISTORY_VIEWS["Sales"]))
+    db.execute_query("ANALYZE")
+
+if __name__ == "__main__":
+    import sys
+    from database import setup_database
+    setup_database()
+    if "--backfill" in sys.argv:
+        backfill_rollups()
+        print("Sales rollups rebuilt.")
+    for rollup, key in SALES_ROLLUPS:
+        count = db.execute_query(f"SELECT COUNT(*) FROM {rollup}", fetch=True)[0][0]
+        print(f"{rollup}: {count} rows")
@@ -0,0 +1,65 @@
+from database import db
+from metadata import INT_FIELDS, FLOAT_FIELDS, FTS_COLUMNS
+from config import SEARCH_LIMIT
+
+def has_fts_index(table):
+    if table not in FTS_COLUMNS:
+        return False
+    result = db.execute_query(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{table}_fts",), fetch=True)
+    return bool(result)
+
+def fts_query(text):
+    # Every whitespace separated term must match, the last token of each as a
+    # prefix: 'ali 555-10' -> "ali"* AND "555-10"*
+    terms = text.split()
+    return " AND ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+def search_rows(table, columns, text, limit=SEARCH_LIMIT, extra=()):
+    # Ranked full-text search for tables that have an FTS index; returns None
+    # when the caller should fall back to a LIKE scan. extra: SQL expressions
+    # selected after the columns, as in KeysetPager.
+    match = fts_query(text)
+    if not match or not has_fts_index(table):
+        return None
+
+    fts = f"{table}_fts"
+    cols = ", ".join([f"{table}.{c}" for c in columns] + list(extra))
+    rows = db.execute_query(
+        f"SELECT {table}.rowid, {cols} FROM {fts} JOIN {table} ON {table}.rowid = {fts}.rowid "
+        f"WHERE {fts} MATCH ? ORDER BY {fts}.rank LIMIT ?", (match, limit), fetch=True)
+
+    numeric = [c for c in columns
+               if c in INT_FIELDS.get(table, set()) or c in FLOAT_FIELDS.get(table, set())]
+    if numeric and text.replace(".", "", 1).isdigit() and len(rows) < limit:
+        where_parts = [f"CAST({c} AS TEXT) LIKE ?" for c in numeric]
+        seen = {r[0] for r in rows}
+        extra = db.execute_query(
+            f"SELECT rowid, {', '.join(list(columns) + list(extra))} FROM {table} WHERE {' OR '.join(where_parts)} LIMIT ?",
+            tuple(f"%{text}%" for _ in numeric) + (limit - len(rows),), fetch=True)
+        rows += [r for r in extra if r[0] not in seen]
+    return rows
+
+def rebuild_fts_indexes():
+    with db.transaction(immediate=True) as conn:
+        for table in FTS_COLUMNS:
+            if has_fts_index(table):
+                conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+def vacuum():
+    # The FTS indexes follow their table's rowid. Medicines has no INTEGER
+    # PRIMARY KEY, so VACUUM may renumber its rows and leave Medicines_fts
+    # pointing at the wrong ones; always rebuild afterwards.
+    db.execute_query("VACUUM")
+    rebuild_fts_indexes()
+
+if __name__ == "__main__":
+    import sys
+    from database import setup_database
+    setup_database()
+    if "--vacuum" in sys.argv:
+        vacuum()
+        print("Database vacuumed, full-text indexes rebuilt.")
+    elif "--rebuild" in sys.argv:
+        rebuild_fts_indexes()
+        print("Full-text indexes rebuilt.")
@@ -0,0 +1,260 @@
+# Local sales service: one process owns the database and serves checkout,
+# item lookups and reports to the counters over HTTP/JSON. Checkouts from all
+# terminals go through a single writer thread that commits them in groups, so
+# counters queue briefly instead of fighting over the SQLite write lock.
+
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from database import db
+from checkout import checkout, checkout_stats, InsufficientStockError, Receipt
+from stock_summary import get_stock_summary
+from report_cache import report_cache
+from config import (SALES_SERVICE_HOST, SALES_SERVICE_PORT, SALES_SERVICE_URL, SALES_SERVICE_WORKERS,
+                    SALES_SERVICE_MAX_BATCH, SALES_SERVICE_TIMEOUT, SALES_SERVICE_COMMIT_TIMEOUT)
+
+class SalesServiceError(Exception):
+    pass
+
+class GroupCommitWriter:
+    def __init__(self, max_batch=SALES_SERVICE_MAX_BATCH):
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sales-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # Everything that queued up while the last batch was committing
+            # goes into the next transaction.
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with db.transaction(immediate=True):
+                for future, fn, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    # fn runs in a savepoint of this transaction, so a failed
+                    # request is rolled back without touching the others.
+                    try:
+                        outcomes.append((future, fn(*args), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # BEGIN or COMMIT failed (e.g. the write lock stayed busy), so
+            # nothing in the batch was committed, whether it had run or not.
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(outcomes)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+def receipt_to_json(receipt):
+    return {"p_id": receipt.p_id, "sale_date": receipt.sale_date, "lines": receipt.lines,
+            "elapsed": receipt.elapsed, "item_count": receipt.item_count, "total": receipt.total}
+
+def lookup_item(medicine_id):
+    rows = db.execute_query("SELECT COALESCE(price, 0) FROM Medicines WHERE medicine_id = ?",
+                            (medicine_id,), fetch=True)
+    return get_stock_summary(medicine_id), rows[0][0] if rows else 0
+
+class SalesRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PharmacySales/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if parts == ["health"]:
+                self.send_json(200, {"ok": True})
+            elif len(parts) == 2 and parts[0] == "items":
+                (on_hand, earliest_expiry, lot_count), price = lookup_item(int(parts[1]))
+                self.send_json(200, {"on_hand": on_hand, "earliest_expiry": earliest_expiry,
+                                     "lot_count": lot_count, "price": price})
+            elif len(parts) == 2 and parts[0] == "reports":
+                from exporter import REPORTS
+                from utils import date_range_params
+                if parts[1] not in REPORTS:
+                    self.send_json(404, {"error": f"Unknown report: {parts[1]}"})
+                    return
+                build_sql, columns, dated = REPORTS[parts[1]]
+                params = date_range_params(query.get("from", ""), query.get("to", "")) if dated else None
+                sql = build_sql(params) if dated else build_sql()
+                self.send_json(200, {"columns": columns, "rows": report_cache.fetch(sql, params)})
+            elif parts == ["stats"]:
+                writer = self.server.writer
+                self.send_json(200, {"baskets": checkout_stats.baskets, "mean_ms": checkout_stats.mean_ms(),
+                                     "conflicts": checkout_stats.conflicts, "retries": checkout_stats.retries,
+                                     "batches": writer.batches, "requests": writer.requests})
+            else:
+                self.send_json(404, {"error": "Not found"})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+    def do_POST(self):
+        if self.path != "/checkout":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            future = self.server.writer.submit(checkout, body["p_id"], body["items"], body.get("sale_date"))
+            try:
+                receipt = future.result(timeout=SALES_SERVICE_COMMIT_TIMEOUT)
+            except TimeoutError:
+                if future.cancel():
+                    self.send_json(503, {"error": "The database is busy, the sale was not recorded."})
+                else:
+                    self.send_json(503, {"error": "The sale is taking too long; check the Sales tab before retrying."})
+                return
+            self.send_json(200, receipt_to_json(receipt))
+        except InsufficientStockError as e:
+            self.send_json(409, {"error": str(e), "medicine_id": e.medicine_id, "name": e.name,
+                                 "available": e.available, "required": e.required})
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {"error": f"Bad request: {e}"})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+class SalesServer(ThreadingHTTPServer):
+    # Requests run on a fixed pool, so each worker keeps its database
+    # connection instead of opening one per request thread.
+    def __init__(self, address, workers=SALES_SERVICE_WORKERS):
+        super().__init__(address, SalesRequestHandler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sales-http")
+        self.writer = GroupCommitWriter()
+        self.writer.start()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        self.writer.stop()
+
+class SalesServiceClient:
+    def __init__(self, url, timeout=SALES_SERVICE_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, path, body=None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        req = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read())
+            except ValueError:
+                raise SalesServiceError(f"Sales service error: HTTP {e.code}")
+            if e.code == 409:
+                raise InsufficientStockError(error["medicine_id"], error["name"], error["available"], error["required"])
+            if e.code == 400:
+                raise ValueError(error["error"])
+            raise SalesServiceError(error["error"])
+        except urllib.error.URLError as e:
+            raise SalesServiceError(f"Sales service unavailable: {e.reason}")
+        except (TimeoutError, ConnectionError) as e:
+            raise SalesServiceError(f"Sales service did not answer: {e}")
+
+    def checkout(self, p_id, items, sale_date=None):
+        start = time.perf_counter()
+        body = self.request("/checkout", {"p_id": p_id, "items": items, "sale_date": sale_date})
+        return Receipt(body["p_id"], body["sale_date"], body["lines"], time.perf_counter() - start)
+
+    def lookup_item(self, medicine_id):
+        body = self.request(f"/items/{int(medicine_id)}")
+        return (body["on_hand"], body["earliest_expiry"], body["lot_count"]), body["price"]
+
+    def get_stock_summary(self, medicine_id):
+        return self.lookup_item(medicine_id)[0]
+
+    def report(self, name, start="", end=""):
+        query = urllib.parse.urlencode({"from": start, "to": end})
+        body = self.request(f"/reports/{urllib.parse.quote(name)}?{query}")
+        return body["columns"], body["rows"]
+
+def sales_service_client():
+    url = os.environ.get("PHARMACY_SALES_SERVICE") or SALES_SERVICE_URL
+    return SalesServiceClient(url) if url else None
+
+if __name__ == "__main__":
+    import argparse
+    from database import setup_database
+
+    parser = argparse.ArgumentParser(description="Run the local sales service.")
+    parser.add_argument("--host", default=SALES_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SALES_SERVICE_PORT)
+    parser.add_argument("--db", help="database file (default: config.SQLITE_PATH)")
+    args = parser.parse_args()
+
+    if args.db:
+        db.set_path(args.db)
+    setup_database()
+    server = SalesServer((args.host, args.port))
+    print(f"Sales service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
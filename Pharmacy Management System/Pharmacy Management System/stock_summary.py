@@ -0,0 +1,51 @@
+from database import db
+from migrations import STOCK_SUMMARY_SELECT
+
+# StockSummary holds one row per medicine (on-hand quantity, earliest expiry
+# of a non-empty lot, non-empty lot count), kept current by triggers on Stock.
+
+def get_stock_summary(medicine_id):
+    if medicine_id is None:
+        return (0, None, 0)
+    result = db.execute_query(
+        "SELECT on_hand, earliest_expiry, lot_count FROM StockSummary WHERE medicine_id = ?",
+        (medicine_id,), fetch=True
+    )
+    return result[0] if result else (0, None, 0)
+
+def get_on_hand(medicine_id):
+    return get_stock_summary(medicine_id)[0]
+
+def find_stock_summary_mismatches():
+    # A summary row whose lots were all deleted is expected to read (0, NULL, 0).
+    return db.execute_query(f'''
+        WITH expected(medicine_id, on_hand, earliest_expiry, lot_count) AS ({STOCK_SUMMARY_SELECT})
+        SELECT e.medicine_id, e.on_hand, s.on_hand, e.earliest_expiry, s.earliest_expiry,
+               e.lot_count, s.lot_count
+        FROM expected e LEFT JOIN StockSummary s ON s.medicine_id = e.medicine_id
+        WHERE e.on_hand IS NOT s.on_hand
+           OR e.earliest_expiry IS NOT s.earliest_expiry
+           OR e.lot_count IS NOT s.lot_count
+        UNION ALL
+        SELECT s.medicine_id, 0, s.on_hand, NULL, s.earliest_expiry, 0, s.lot_count
+        FROM StockSummary s
+        WHERE s.medicine_id NOT IN (SELECT medicine_id FROM expected)
+          AND (s.on_hand != 0 OR s.earliest_expiry IS NOT NULL OR s.lot_count != 0)
+    ''', fetch=True)
+
+def rebuild_stock_summary():
+    with db.transaction(immediate=True) as conn:
+        conn.execute("DELETE FROM StockSummary")
+        conn.execute(f"INSERT INTO StockSummary (medicine_id, on_hand, earliest_expiry, lot_count) {STOCK_SUMMARY_SELECT}")
+
+if __name__ == "__main__":
+    import sys
+    from database import setup_database
+    setup_database()
+    mismatches = find_stock_summary_mismatches()
+    print(f"{len(mismatches)} medicines out of sync")
+    for row in mismatches[:20]:
+        print("  medicine_id={} on_hand {}/{} earliest {}/{} lots {}/{}".format(*row))
+    if mismatches and "--rebuild" in sys.argv:
+        rebuild_stock_summary()
+        print("StockSummary rebuilt.")
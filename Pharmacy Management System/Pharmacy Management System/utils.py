@@ -1,5 +1,8 @@
 from datetime import datetime, timedelta
 from database import db
+from fk_cache import fk_cache
+from expiry import expiry_status
+from config import DAILY_SALES_LIMIT
 
 def to_int_or_none(val):
     if val is None or val == "":
@@ -17,14 +20,24 @@ def to_float_or_none(val):
     except:
         return None
 
+def date_range_params(start, end):
+    start = (start or "").strip()
+    end = (end or "").strip()
+    for val in (start, end):
+        if val:
+            datetime.strptime(val, "%Y-%m-%d")
+    return (start or "0000-01-01", end or "9999-12-31")
+
+def daily_sales_limit(params):
+    # Only the default "recent days" view is capped; a chosen range shows every day.
+    return DAILY_SALES_LIMIT if tuple(params) == date_range_params("", "") else None
+
 def fetch_all(table):
     return db.execute_query(f"SELECT * FROM {table}", fetch=True)
 
 def fetch_fk_choices(table, id_col, display_col):
-    query = f"SELECT {id_col}, {display_col} FROM {table} WHERE {id_col} IS NOT NULL"
     try:
-        items = db.execute_query(query, fetch=True)
-        return [f"{r[0]} - {r[1] if r[1] else 'N/A'}" for r in items]
+        return fk_cache.get(table, id_col, display_col).labels
     except:
         return []
 
@@ -40,17 +53,14 @@ def exists_medicine_id(medicine_id, exclude_keys=None):
     if medicine_id is None:
         return False
     conn = db.get_connection()
-    cursor = conn.cursor()
     if exclude_keys:
-        cursor.execute(
+        cursor = conn.execute(
             "SELECT 1 FROM Medicines WHERE medicine_id = ? AND NOT (name = ? AND manufacturer_id = ?)",
             (medicine_id, exclude_keys.get("name"), exclude_keys.get("manufacturer_id"))
         )
     else:
-        cursor.execute("SELECT 1 FROM Medicines WHERE medicine_id = ?", (medicine_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row is not None
+        cursor = conn.execute("SELECT 1 FROM Medicines WHERE medicine_id = ?", (medicine_id,))
+    return cursor.fetchone() is not None
 
 def count_refs(table, col, val):
     if val is None:
@@ -62,22 +72,7 @@ def count_refs(table, col, val):
         return 0
 
 def check_expiration(expiration_date_str, warning_days=30):
-    if not expiration_date_str or expiration_date_str == "None":
-        return None
-    
-    try:
-        exp_date = datetime.strptime(str(expiration_date_str), "%Y-%m-%d").date()
-        today = datetime.now().date()
-        days_left = (exp_date - today).days
-        
-        if days_left < 0:
-            return "expired"
-        elif days_left <= warning_days:
-            return "expiring_soon"
-        else:
-            return "ok"
-    except:
-        return None
+    return expiry_status(expiration_date_str, warning_days)
 
 def check_medicine_expiration(medicine_id, warning_days=30):
     if medicine_id is None:
@@ -85,7 +80,7 @@ def check_medicine_expiration(medicine_id, warning_days=30):
     
     try:
         result = db.execute_query(
-            "SELECT MIN(expiration_date) FROM Stock WHERE medicine_id = ? AND quantity > 0",
+            "SELECT earliest_expiry FROM StockSummary WHERE medicine_id = ?",
             (medicine_id,), fetch=True
         )
         if result and result[0][0]:
@@ -1,3 +1,5 @@
 from .table_manager import TableManager
 from .reports_panel import ReportsPanel
 from .quick_sale import QuickSalePanel
+from .diagnostics_panel import DiagnosticsPanel
+from .autocomplete import AutocompletePicker
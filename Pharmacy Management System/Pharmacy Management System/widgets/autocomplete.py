@@ -0,0 +1,140 @@
+import tkinter as tk
+from tkinter import ttk
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import parse_fk_choice
+from config import PICKER_LIMIT, PICKER_DEBOUNCE_MS
+
+# Type-ahead replacement for a readonly "id - name" Combobox. The bound
+# variable holds the chosen label (or "" while the user is typing), so
+# parse_fk_choice(var.get()) keeps working. Only the top matches from
+# FKChoices.search are ever put into Tk. Fires <<PickerSelected>>.
+class AutocompletePicker(ttk.Frame):
+    def __init__(self, parent, textvariable, width=28, limit=PICKER_LIMIT):
+        super().__init__(parent)
+        self.var = textvariable
+        self.limit = limit
+        self.choices = None
+        self.matches = []
+        self.popup = None
+        self.listbox = None
+        self._after_id = None
+        self._syncing = False
+        
+        self.text_var = tk.StringVar(value=self.var.get())
+        self.entry = ttk.Entry(self, textvariable=self.text_var, width=width)
+        self.entry.pack(fill="x")
+        
+        self.text_var.trace_add("write", self._on_text)
+        self.var.trace_add("write", self._on_var)
+        self.entry.bind("<Down>", lambda e: self._move(1))
+        self.entry.bind("<Up>", lambda e: self._move(-1))
+        self.entry.bind("<Return>", self._on_return)
+        self.entry.bind("<Escape>", lambda e: self.hide())
+        self.entry.bind("<FocusOut>", lambda e: self.after(150, self._hide_unless_focused))
+    
+    def set_choices(self, choices):
+        self.choices = choices
+        if self.popup is not None:
+            self._search()
+    
+    def get(self):
+        return self.var.get()
+    
+    def _sync(self, var, value):
+        self._syncing = True
+        try:
+            var.set(value)
+        finally:
+            self._syncing = False
+    
+    def _on_var(self, *args):
+        if self._syncing:
+            return
+        value = self.var.get()
+        if value != self.text_var.get():
+            self._sync(self.text_var, value)
+        self.hide()
+    
+    def _on_text(self, *args):
+        if self._syncing:
+            return
+        if self.var.get():
+            self._sync(self.var, "")
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(PICKER_DEBOUNCE_MS, self._search)
+    
+    def _search(self):
+        self._after_id = None
+        text = self.text_var.get().strip()
+        if not text or self.choices is None:
+            self.hide()
+            return
+        self.matches = self.choices.search(text, self.limit)
+        if self.matches:
+            self.show()
+        else:
+            self.hide()
+    
+    def show(self):
+        if self.popup is None:
+            self.popup = tk.Toplevel(self)
+            self.popup.wm_overrideredirect(True)
+            self.listbox = tk.Listbox(self.popup, exportselection=False, activestyle="dotbox")
+            self.listbox.pack(fill="both", expand=True)
+            self.listbox.bind("<ButtonRelease-1>", lambda e: self._choose(self.listbox.nearest(e.y)))
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *self.matches)
+        self.listbox.config(height=min(len(self.matches), 10))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(0)
+        self.popup.geometry(f"{self.entry.winfo_width()}x{self.listbox.winfo_reqheight()}"
+                            f"+{self.entry.winfo_rootx()}+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+        self.popup.lift()
+    
+    def hide(self):
+        if self.popup is not None:
+            self.popup.destroy()
+            self.popup = None
+            self.listbox = None
+    
+    def _hide_unless_focused(self):
+        focus = self.focus_get()
+        if self.popup is not None and focus is not self.listbox:
+            self.hide()
+    
+    def _move(self, delta):
+        if self.popup is None:
+            self._search()
+            return "break"
+        current = self.listbox.curselection()
+        index = min(max((current[0] if current else -1) + delta, 0), len(self.matches) - 1)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+    
+    def _on_return(self, event):
+        if self.popup is not None:
+            current = self.listbox.curselection()
+            return self._choose(current[0] if current else 0)
+        # A typed id picks that row directly.
+        item_id = parse_fk_choice(self.text_var.get())
+        if self.choices is not None and item_id in self.choices.label_by_id:
+            self.matches = [self.choices.label_by_id[item_id]]
+            return self._choose(0)
+        return "break"
+    
+    def _choose(self, index):
+        if not 0 <= index < len(self.matches):
+            return "break"
+        label = self.matches[index]
+        self._sync(self.text_var, label)
+        self._sync(self.var, label)
+        self.hide()
+        self.entry.icursor(tk.END)
+        self.event_generate("<<PickerSelected>>")
+        return "break"
@@ -0,0 +1,93 @@
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from instrumentation import QueryProfiler
+from config import SLOW_QUERY_LOG
+
+class DiagnosticsPanel(ttk.Frame):
+    COLUMNS = ("sql", "count", "total_ms", "mean_ms", "max_ms", "rows", "call_site")
+    
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.profiler = db.profiler or QueryProfiler()
+        self.create_widgets()
+    
+    def create_widgets(self):
+        ttk.Label(self, text="Query Diagnostics", font=('Helvetica', 14, 'bold')).pack(pady=10)
+        
+        ctrl_frame = ttk.Frame(self)
+        ctrl_frame.pack(pady=5)
+        
+        self.enabled_var = tk.BooleanVar(value=db.profiler is not None)
+        ttk.Checkbutton(ctrl_frame, text="Record query statistics", variable=self.enabled_var,
+                        command=self.on_toggle).grid(row=0, column=0, padx=5)
+        
+        ttk.Label(ctrl_frame, text="Slow query threshold (ms):").grid(row=0, column=1, padx=5)
+        self.threshold_var = tk.StringVar(value=str(self.profiler.slow_ms))
+        ttk.Entry(ctrl_frame, textvariable=self.threshold_var, width=8).grid(row=0, column=2, padx=5)
+        
+        ttk.Button(ctrl_frame, text="Refresh", command=self.refresh, width=12).grid(row=0, column=3, padx=5)
+        ttk.Button(ctrl_frame, text="Reset", command=self.on_reset, width=12).grid(row=0, column=4, padx=5)
+        
+        ttk.Label(self, text=f"Slow statements and their query plans are written to {SLOW_QUERY_LOG}",
+                  foreground="gray").pack()
+        
+        self.total_tree = self._make_tree("Top statements by total time")
+        self.count_tree = self._make_tree("Top statements by count")
+    
+    def _make_tree(self, title):
+        frame = ttk.LabelFrame(self, text=title, padding=5)
+        frame.pack(fill="both", expand=True, padx=10, pady=5)
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+        
+        tree = ttk.Treeview(frame, columns=self.COLUMNS, show='headings', height=8)
+        widths = {"sql": 420, "count": 60, "total_ms": 80, "mean_ms": 80, "max_ms": 80, "rows": 70, "call_site": 260}
+        for col in self.COLUMNS:
+            tree.heading(col, text=col.replace('_', ' ').upper())
+            tree.column(col, width=widths[col], anchor="w" if col in ("sql", "call_site") else "e")
+        tree.grid(row=0, column=0, sticky="nsew")
+        
+        vsb = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        vsb.grid(row=0, column=1, sticky="ns")
+        return tree
+    
+    def on_toggle(self):
+        if self.enabled_var.get():
+            self.apply_threshold()
+            db.profiler = self.profiler
+        else:
+            db.profiler = None
+    
+    def apply_threshold(self):
+        try:
+            self.profiler.slow_ms = float(self.threshold_var.get())
+        except ValueError:
+            messagebox.showwarning("Warning", "Threshold must be a number!")
+            self.threshold_var.set(str(self.profiler.slow_ms))
+    
+    def on_reset(self):
+        self.profiler.reset()
+        self.refresh()
+    
+    def refresh(self):
+        self.apply_threshold()
+        for tree, by in ((self.total_tree, "total"), (self.count_tree, "count")):
+            children = tree.get_children()
+            if children:
+                tree.delete(*children)
+            for entry in self.profiler.top(by):
+                tree.insert("", "end", values=(
+                    entry.sql[:200],
+                    entry.count,
+                    f"{entry.total * 1000:.1f}",
+                    f"{entry.mean * 1000:.2f}",
+                    f"{entry.max * 1000:.1f}",
+                    entry.rows,
+                    ", ".join(sorted(entry.call_sites))[:200],
+                ))
@@ -1,18 +1,35 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from datetime import datetime
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import db
-from utils import (fetch_fk_choices, parse_fk_choice, to_int_or_none, 
-                   check_medicine_expiration, EXPIRATION_WARNING_MESSAGE)
+from checkout import checkout, InsufficientStockError
+from executor import query_executor
+from stock_summary import get_stock_summary
+from fk_cache import fk_cache
+from service import sales_service_client
+from barcode_index import barcode_index
+from config import BARCODE_REFRESH_MS
+from .autocomplete import AutocompletePicker
+from utils import (parse_fk_choice, to_int_or_none, 
+                   check_expiration, EXPIRATION_WARNING_MESSAGE)
+
+# Status of a scanned line until its background stock check comes back.
+CHECKING = "checking"
+STOCK_UNKNOWN = "STOCK UNKNOWN"
 
 class QuickSalePanel(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.cart = []
+        self._sale_pending = False
+        self._barcode_job = None
+        self.choices = {}
+        # With a sales service configured, stock lookups and checkout go
+        # through it; everything else still reads the database directly.
+        self.sales = sales_service_client()
         self.create_widgets()
     
     def create_widgets(self):
@@ -27,19 +44,29 @@ class QuickSalePanel(ttk.Frame):
         left_frame = ttk.Frame(main_frame)
         left_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         
+        scan_frame = ttk.LabelFrame(left_frame, text="Scan Barcode", padding=15)
+        scan_frame.pack(fill="x", pady=5)
+        
+        self.scan_var = tk.StringVar()
+        self.scan_entry = ttk.Entry(scan_frame, textvariable=self.scan_var, width=30)
+        self.scan_entry.grid(row=0, column=0, sticky="w", padx=5)
+        self.scan_entry.bind("<Return>", self.on_scan)
+        self.scan_status = ttk.Label(scan_frame, text="", foreground="blue")
+        self.scan_status.grid(row=0, column=1, sticky="w", padx=5)
+        
         form = ttk.LabelFrame(left_frame, text="Add Item to Cart", padding=15)
         form.pack(fill="x", pady=5)
         
         ttk.Label(form, text="Pharmacist *:").grid(row=0, column=0, sticky="w", pady=5)
         self.pharmacist_var = tk.StringVar()
-        self.pharmacist_cb = ttk.Combobox(form, textvariable=self.pharmacist_var, state="readonly", width=25)
+        self.pharmacist_cb = AutocompletePicker(form, self.pharmacist_var, width=25)
         self.pharmacist_cb.grid(row=0, column=1, pady=5, padx=10, sticky="w")
         
         ttk.Label(form, text="Medicine *:").grid(row=1, column=0, sticky="w", pady=5)
         self.medicine_var = tk.StringVar()
-        self.medicine_cb = ttk.Combobox(form, textvariable=self.medicine_var, state="readonly", width=25)
+        self.medicine_cb = AutocompletePicker(form, self.medicine_var, width=25)
         self.medicine_cb.grid(row=1, column=1, pady=5, padx=10, sticky="w")
-        self.medicine_cb.bind("<<ComboboxSelected>>", self.on_medicine_selected)
+        self.medicine_cb.bind("<<PickerSelected>>", self.on_medicine_selected)
         
         ttk.Label(form, text="Quantity *:").grid(row=2, column=0, sticky="w", pady=5)
         self.quantity_var = tk.StringVar(value="1")
@@ -86,6 +113,7 @@ class QuickSalePanel(ttk.Frame):
         
         self.cart_tree.tag_configure('expired', background='#ffcccc')
         self.cart_tree.tag_configure('expiring', background='#ffffcc')
+        self.cart_tree.tag_configure('short', background='#ffd9b3')
         
         self.cart_tree.grid(row=0, column=0, sticky="nsew")
         
@@ -113,39 +141,171 @@ class QuickSalePanel(ttk.Frame):
         checkout_frame = ttk.Frame(self)
         checkout_frame.pack(fill="x", padx=10, pady=10)
         
-        ttk.Button(checkout_frame, text="Complete Sale", command=self.complete_sale, width=20).pack(side="right", padx=10)
+        self.checkout_btn = ttk.Button(checkout_frame, text="Complete Sale", command=self.complete_sale, width=20)
+        self.checkout_btn.pack(side="right", padx=10)
         
         self.result_label = ttk.Label(checkout_frame, text="", font=('Helvetica', 11))
         self.result_label.pack(side="left", padx=10)
         
         self.refresh_choices()
+        self.refresh_barcodes()
+        self._barcode_job = self.after(BARCODE_REFRESH_MS, self._poll_barcodes)
+        self.master.bind("<Map>", self._on_tab_shown, add="+")
+    
+    def refresh_barcodes(self):
+        # Only reads the Medicines version counter unless the catalog changed.
+        query_executor.submit(barcode_index.refresh,
+                              on_done=lambda index: self.scan_status.config(text=f"{len(index)} barcodes"),
+                              key=(id(self), "barcodes"))
+    
+    def _poll_barcodes(self):
+        # Polls only while the tab is showing; showing it again, or a scan
+        # that misses, refreshes the index as well.
+        self._barcode_job = None
+        if self.winfo_viewable():
+            self.refresh_barcodes()
+            self._barcode_job = self.after(BARCODE_REFRESH_MS, self._poll_barcodes)
+    
+    def _on_tab_shown(self, event):
+        if self._barcode_job is None:
+            self._poll_barcodes()
+    
+    def on_scan(self, event=None):
+        code = self.scan_var.get().strip()
+        self.scan_var.set("")
+        if code:
+            self._scan(code, refreshed=False)
+    
+    def _scan(self, code, refreshed):
+        if self._sale_pending:
+            self.result_label.config(text="A sale is being processed, please wait.", foreground="red")
+            return
+        entry = barcode_index.lookup(code)
+        if entry is None and not refreshed:
+            # The catalog may have changed since the last poll.
+            query_executor.submit(barcode_index.refresh,
+                                  on_done=lambda index: self._scan(code, refreshed=True),
+                                  on_error=lambda e: self.result_label.config(
+                                      text=f"Could not load barcodes: {e}", foreground="red"))
+            return
+        if entry is None:
+            self.bell()
+            message = f"Unknown barcode: {code}" if barcode_index.loaded else "Barcode list is still loading..."
+            self.result_label.config(text=message, foreground="red")
+            return
+        m_id, medicine_name, unit_price = entry
+        self._put_in_cart(m_id, medicine_name, 1, unit_price, CHECKING, None)
+        self.update_cart_display()
+        self.result_label.config(text=f"Scanned {medicine_name}.", foreground="green")
+        # Stock and expiry are checked after the item is in the cart, so
+        # scanning never waits on the database; checkout re-checks stock anyway.
+        summary_fn = self.sales.get_stock_summary if self.sales else get_stock_summary
+        query_executor.submit(summary_fn, m_id,
+                              on_done=lambda summary: self._check_scanned(m_id, summary),
+                              on_error=lambda e: self._scan_check_failed(m_id, e),
+                              key=(id(self), "scan", m_id))
+    
+    def _check_scanned(self, m_id, summary):
+        item = next((item for item in self.cart if item['medicine_id'] == m_id), None)
+        if item is None:
+            return
+        available_stock, earliest_expiry, _ = summary
+        item['exp_status'] = check_expiration(earliest_expiry)
+        item['status'] = self._status_text(item['exp_status'])
+        item['short'] = available_stock < item['quantity']
+        if item['short']:
+            item['status'] = f"ONLY {available_stock} LEFT"
+            self.bell()
+        self.update_cart_display()
+    
+    def _scan_check_failed(self, m_id, error):
+        item = next((item for item in self.cart if item['medicine_id'] == m_id), None)
+        if item is None:
+            return
+        # Marked like a short line; checkout still refuses missing stock.
+        item['status'] = STOCK_UNKNOWN
+        item['short'] = True
+        self.bell()
+        self.update_cart_display()
+        self.result_label.config(text=f"Could not check stock for {item['medicine_name']}: {error}", foreground="red")
+    
+    @staticmethod
+    def _status_text(status):
+        if status == "expired":
+            return "EXPIRED"
+        if status == "expiring_soon":
+            return "EXPIRING SOON"
+        return "OK"
+    
+    def _put_in_cart(self, m_id, medicine_name, qty, unit_price, status_text, status):
+        for item in self.cart:
+            if item['medicine_id'] == m_id:
+                item['quantity'] += qty
+                item['subtotal'] = item['quantity'] * unit_price
+                return item
+        item = {
+            'medicine_id': m_id,
+            'medicine_name': medicine_name,
+            'quantity': qty,
+            'unit_price': unit_price,
+            'subtotal': unit_price * qty,
+            'status': status_text,
+            'exp_status': status,
+            'short': False,
+        }
+        self.cart.append(item)
+        return item
     
     def refresh_choices(self):
-        self.pharmacist_cb['values'] = fetch_fk_choices("Pharmacist", "p_id", "p_last_name")
-        self.medicine_cb['values'] = fetch_fk_choices("Medicines", "medicine_id", "name")
+        for cb, spec in ((self.pharmacist_cb, ("Pharmacist", "p_id", "p_last_name")),
+                         (self.medicine_cb, ("Medicines", "medicine_id", "name"))):
+            query_executor.submit(fk_cache.get_indexed, *spec,
+                                  on_done=lambda choices, cb=cb: self._set_choices(cb, choices),
+                                  key=(id(self), "fk", spec[0]))
         self.result_label.config(text="Lists updated.", foreground="blue")
         self.expiration_warning_label.config(text="")
         self.stock_label.config(text="")
     
+    def _set_choices(self, cb, choices):
+        if self.choices.get(cb) is not choices:
+            cb.set_choices(choices)
+            self.choices[cb] = choices
+    
     def on_medicine_selected(self, event):
         m_id = parse_fk_choice(self.medicine_var.get())
         if m_id:
-            stock_result = db.execute_query(
-                "SELECT COALESCE(SUM(quantity), 0) FROM Stock WHERE medicine_id = ?",
-                (m_id,), fetch=True
-            )
-            stock = stock_result[0][0] if stock_result else 0
-            self.stock_label.config(text=f"(Stock: {stock})")
-            
-            status = check_medicine_expiration(m_id)
-            if status in ("expired", "expiring_soon"):
-                self.expiration_warning_label.config(text=EXPIRATION_WARNING_MESSAGE)
-            else:
-                self.expiration_warning_label.config(text="")
+            self.stock_label.config(text="(Stock: ...)")
+            summary_fn = self.sales.get_stock_summary if self.sales else get_stock_summary
+            query_executor.submit(summary_fn, m_id,
+                                  on_done=lambda summary: self._show_stock_info(m_id, summary),
+                                  on_error=lambda e: self.stock_label.config(text=""),
+                                  key=(id(self), "stock"))
         else:
+            query_executor.cancel((id(self), "stock"))
             self.stock_label.config(text="")
             self.expiration_warning_label.config(text="")
     
+    def _show_stock_info(self, m_id, summary):
+        if parse_fk_choice(self.medicine_var.get()) != m_id:
+            return
+        stock, earliest_expiry, _ = summary
+        self.stock_label.config(text=f"(Stock: {stock})")
+        
+        status = check_expiration(earliest_expiry)
+        if status in ("expired", "expiring_soon"):
+            self.expiration_warning_label.config(text=EXPIRATION_WARNING_MESSAGE)
+        else:
+            self.expiration_warning_label.config(text="")
+    
+    @staticmethod
+    def _lookup_item(m_id):
+        price_result = db.execute_query(
+            "SELECT COALESCE(price, 0) FROM Medicines WHERE medicine_id = ?",
+            (m_id,), fetch=True
+        )
+        unit_price = price_result[0][0] if price_result else 0
+        return get_stock_summary(m_id), unit_price
+    
     def add_to_cart(self):
         m_id = parse_fk_choice(self.medicine_var.get())
         qty = to_int_or_none(self.quantity_var.get())
@@ -157,12 +317,20 @@ class QuickSalePanel(ttk.Frame):
         if not qty or qty <= 0:
             messagebox.showwarning("Warning", "Please enter a valid quantity!")
             return
+        if self._sale_pending:
+            messagebox.showwarning("Warning", "A sale is being processed, please wait.")
+            return
         
-        stock_result = db.execute_query(
-            "SELECT COALESCE(SUM(quantity), 0) FROM Stock WHERE medicine_id = ?",
-            (m_id,), fetch=True
-        )
-        available_stock = stock_result[0][0] if stock_result else 0
+        lookup_fn = self.sales.lookup_item if self.sales else self._lookup_item
+        query_executor.submit(lookup_fn, m_id,
+                              on_done=lambda result: self._add_item(m_id, medicine_name, qty, *result),
+                              on_error=lambda e: messagebox.showerror("Error", f"Add error: {e}"))
+    
+    def _add_item(self, m_id, medicine_name, qty, summary, unit_price):
+        if self._sale_pending:
+            messagebox.showwarning("Warning", "A sale is being processed, please wait.")
+            return
+        available_stock, earliest_expiry, _ = summary
         
         already_in_cart = sum(item['quantity'] for item in self.cart if item['medicine_id'] == m_id)
         
@@ -171,38 +339,8 @@ class QuickSalePanel(ttk.Frame):
                 f"Insufficient stock!\nAvailable: {available_stock}\nAlready in cart: {already_in_cart}\nRequested: {qty}")
             return
         
-        price_result = db.execute_query(
-            "SELECT COALESCE(price, 0) FROM Medicines WHERE medicine_id = ?",
-            (m_id,), fetch=True
-        )
-        unit_price = price_result[0][0] if price_result else 0
-        
-        status = check_medicine_expiration(m_id)
-        status_text = "OK"
-        if status == "expired":
-            status_text = "EXPIRED"
-        elif status == "expiring_soon":
-            status_text = "EXPIRING SOON"
-        
-        existing_item = None
-        for item in self.cart:
-            if item['medicine_id'] == m_id:
-                existing_item = item
-                break
-        
-        if existing_item:
-            existing_item['quantity'] += qty
-            existing_item['subtotal'] = existing_item['quantity'] * unit_price
-        else:
-            self.cart.append({
-                'medicine_id': m_id,
-                'medicine_name': medicine_name,
-                'quantity': qty,
-                'unit_price': unit_price,
-                'subtotal': unit_price * qty,
-                'status': status_text,
-                'exp_status': status
-            })
+        status = check_expiration(earliest_expiry)
+        self._put_in_cart(m_id, medicine_name, qty, unit_price, self._status_text(status), status)
         
         self.update_cart_display()
         self.quantity_var.set("1")
@@ -217,7 +355,9 @@ class QuickSalePanel(ttk.Frame):
         
         for item in self.cart:
             tags = ()
-            if item['exp_status'] == "expired":
+            if item.get('short'):
+                tags = ('short',)
+            elif item['exp_status'] == "expired":
                 tags = ('expired',)
             elif item['exp_status'] == "expiring_soon":
                 tags = ('expiring',)
@@ -238,6 +378,8 @@ class QuickSalePanel(ttk.Frame):
         self.total_amount_label.config(text=f"${total_amount:.2f}")
     
     def remove_from_cart(self):
+        if self._sale_pending:
+            return
         selected = self.cart_tree.selection()
         if not selected:
             messagebox.showwarning("Warning", "Please select an item to remove!")
@@ -251,7 +393,7 @@ class QuickSalePanel(ttk.Frame):
         self.result_label.config(text="Item removed from cart.", foreground="blue")
     
     def clear_cart(self):
-        if not self.cart:
+        if not self.cart or self._sale_pending:
             return
         
         if messagebox.askyesno("Confirm", "Clear all items from cart?"):
@@ -260,6 +402,8 @@ class QuickSalePanel(ttk.Frame):
             self.result_label.config(text="Cart cleared.", foreground="blue")
     
     def complete_sale(self):
+        if self._sale_pending:
+            return
         if not self.cart:
             messagebox.showwarning("Warning", "Cart is empty!")
             return
@@ -269,65 +413,49 @@ class QuickSalePanel(ttk.Frame):
             messagebox.showwarning("Warning", "Please select a pharmacist!")
             return
         
-        expired_items = [item for item in self.cart if item['exp_status'] in ("expired", "expiring_soon")]
+        checking = [item['medicine_name'] for item in self.cart if item['status'] == CHECKING]
+        if checking:
+            messagebox.showwarning("Warning", f"Still checking stock for {', '.join(checking)}, please wait.")
+            return
+        
+        # A line whose check failed has no known expiry, so it is confirmed too.
+        expired_items = [item for item in self.cart
+                         if item['exp_status'] in ("expired", "expiring_soon") or item['status'] == STOCK_UNKNOWN]
         if expired_items:
             expired_names = ", ".join([item['medicine_name'] for item in expired_items])
             if not messagebox.askyesno("Expiration Warning", 
                 f"{EXPIRATION_WARNING_MESSAGE}\n\nAffected items: {expired_names}\n\nDo you still want to proceed?"):
                 return
         
-        for item in self.cart:
-            stock_result = db.execute_query(
-                "SELECT COALESCE(SUM(quantity), 0) FROM Stock WHERE medicine_id = ?",
-                (item['medicine_id'],), fetch=True
-            )
-            available = stock_result[0][0] if stock_result else 0
-            if available < item['quantity']:
-                messagebox.showerror("Error", 
-                    f"Insufficient stock for {item['medicine_name']}!\nAvailable: {available}, Required: {item['quantity']}")
-                return
+        self._sale_pending = True
+        self.checkout_btn.config(state="disabled")
+        self.result_label.config(text="Processing sale...", foreground="blue")
+        checkout_fn = self.sales.checkout if self.sales else checkout
+        query_executor.submit(checkout_fn, p_id, list(self.cart),
+                              on_done=self._sale_completed, on_error=self._sale_failed)
+    
+    def _sale_completed(self, receipt):
+        self._sale_pending = False
+        self.checkout_btn.config(state="normal")
+        self.cart = []
+        self.update_cart_display()
         
-        try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            total_sale = 0
-            
-            for item in self.cart:
-                db.execute_query(
-                    "INSERT INTO Sales (p_id, medicine_id, quantity, sale_date, total_price) VALUES (?, ?, ?, ?, ?)",
-                    (p_id, item['medicine_id'], item['quantity'], today, item['subtotal'])
-                )
-                
-                remaining_qty = item['quantity']
-                stock_rows = db.execute_query(
-                    "SELECT stock_id, quantity FROM Stock WHERE medicine_id = ? AND quantity > 0 ORDER BY expiration_date ASC",
-                    (item['medicine_id'],), fetch=True
-                )
-                
-                for stock_id, stock_qty in stock_rows:
-                    if remaining_qty <= 0:
-                        break
-                    
-                    deduct = min(remaining_qty, stock_qty)
-                    db.execute_query(
-                        "UPDATE Stock SET quantity = quantity - ? WHERE stock_id = ?",
-                        (deduct, stock_id)
-                    )
-                    remaining_qty -= deduct
-                
-                total_sale += item['subtotal']
-            
-            item_count = len(self.cart)
-            self.cart = []
-            self.update_cart_display()
-            
-            self.result_label.config(
-                text=f"Sale completed! {item_count} items, Total: ${total_sale:.2f}",
-                foreground="green"
-            )
-            
-            messagebox.showinfo("Success", 
-                f"Sale completed successfully!\n\nItems sold: {item_count}\nTotal amount: ${total_sale:.2f}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Sale failed: {e}")
-            self.result_label.config(text=f"Error: {e}", foreground="red")
+        self.result_label.config(
+            text=f"Sale completed! {receipt.item_count} items, Total: ${receipt.total:.2f} "
+                 f"({receipt.elapsed * 1000:.1f} ms)",
+            foreground="green"
+        )
+        
+        messagebox.showinfo("Success", 
+            f"Sale completed successfully!\n\nItems sold: {receipt.item_count}\nTotal amount: ${receipt.total:.2f}")
+    
+    def _sale_failed(self, error):
+        self._sale_pending = False
+        self.checkout_btn.config(state="normal")
+        if isinstance(error, InsufficientStockError):
+            self.result_label.config(text="")
+            messagebox.showerror("Error", 
+                f"Insufficient stock for {error.name}!\nAvailable: {error.available}, Required: {error.required}")
+        else:
+            messagebox.showerror("Error", f"Sale failed: {error}")
+            self.result_label.config(text=f"Error: {error}", foreground="red")
@@ -1,20 +1,40 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import tkinter.font as tkfont
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import db
+from executor import query_executor
 from queries import SQLQueries
+from metadata import TABS_INFO
+from exporter import export_query, export_table
+from report_cache import report_cache
+from config import REPORT_PAGE_SIZE, REPORT_RENDER_CHUNK, REPORT_SAMPLE_ROWS
+from utils import date_range_params, daily_sales_limit
 
 class ReportsPanel(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
+        self.last_report = None
+        self.sort = None
+        self.loaded = 0
+        self._generation = 0
         self.create_widgets()
     
     def create_widgets(self):
         ttk.Label(self, text="Reports and Analytics", font=('Helvetica', 14, 'bold')).pack(pady=10)
         
+        range_frame = ttk.Frame(self)
+        range_frame.pack(pady=5)
+        
+        ttk.Label(range_frame, text="From (YYYY-MM-DD):").grid(row=0, column=0, padx=5)
+        self.start_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.start_var, width=12).grid(row=0, column=1, padx=5)
+        ttk.Label(range_frame, text="To:").grid(row=0, column=2, padx=5)
+        self.end_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.end_var, width=12).grid(row=0, column=3, padx=5)
+        
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=10)
         
@@ -25,74 +45,232 @@ class ReportsPanel(ttk.Frame):
             ("Top Selling", self.show_top_selling),
             ("Oldest Patient", self.show_oldest_patient),
             ("Stock Status", self.show_stock_status),
+            ("Malformed Dates", self.show_malformed_dates),
+            ("Sales by Year", self.show_sales_by_year),
         ]
         
         for i, (text, cmd) in enumerate(reports):
             row, col = divmod(i, 3)
             ttk.Button(btn_frame, text=text, command=cmd, width=18).grid(row=row, column=col, padx=5, pady=5)
         
-        result_frame = ttk.LabelFrame(self, text="Results", padding=10)
-        result_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        export_frame = ttk.Frame(self)
+        export_frame.pack(pady=5)
         
-        self.result_text = tk.Text(result_frame, height=25, width=90, font=('Consolas', 10))
-        self.result_text.pack(fill="both", expand=True)
-    
-    def display(self, title, rows, columns):
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, f"{'=' * 60}\n  {title}\n{'=' * 60}\n\n")
+        ttk.Button(export_frame, text="Export Results...", command=self.on_export_report, width=18).grid(row=0, column=0, padx=5)
+        self.export_table_var = tk.StringVar(value=next(iter(TABS_INFO)))
+        ttk.Combobox(export_frame, textvariable=self.export_table_var, values=list(TABS_INFO),
+                     state="readonly", width=14).grid(row=0, column=1, padx=5)
+        ttk.Button(export_frame, text="Export Table...", command=self.on_export_table, width=18).grid(row=0, column=2, padx=5)
+        self.export_status = tk.StringVar()
+        ttk.Label(export_frame, textvariable=self.export_status).grid(row=0, column=3, padx=5)
         
-        if not rows:
-            self.result_text.insert(tk.END, "  No results found.\n")
-            return
+        result_frame = ttk.LabelFrame(self, text="Results", padding=10)
+        result_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        result_frame.rowconfigure(1, weight=1)
+        result_frame.columnconfigure(0, weight=1)
         
-        header = "  " + " | ".join(str(c).ljust(15)[:15] for c in columns)
-        self.result_text.insert(tk.END, header + "\n")
-        self.result_text.insert(tk.END, "  " + "-" * (len(columns) * 18) + "\n")
+        self.title_var = tk.StringVar()
+        ttk.Label(result_frame, textvariable=self.title_var, font=('Helvetica', 11, 'bold')).grid(
+            row=0, column=0, columnspan=2, sticky="w", pady=(0, 5))
         
-        for row in rows:
-            line = "  " + " | ".join(str(v if v is not None else "N/A").ljust(15)[:15] for v in row)
-            self.result_text.insert(tk.END, line + "\n")
+        self.tree = ttk.Treeview(result_frame, show='headings', height=20)
+        vsb = ttk.Scrollbar(result_frame, orient="vertical", command=self.tree.yview)
+        hsb = ttk.Scrollbar(result_frame, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(yscroll=vsb.set, xscroll=hsb.set)
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        vsb.grid(row=1, column=1, sticky="ns")
+        hsb.grid(row=2, column=0, sticky="ew")
         
-        self.result_text.insert(tk.END, f"\n  Total: {len(rows)} records\n")
+        status_frame = ttk.Frame(result_frame)
+        status_frame.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        self.status_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.status_var).pack(side="left")
+        self.load_more_btn = ttk.Button(status_frame, text="Load more", command=self.load_more, state="disabled")
+        self.load_more_btn.pack(side="right")
     
-    def show_low_stock(self):
+    def set_columns(self, columns):
+        self.tree.delete(*self.tree.get_children())
+        self.tree["columns"] = [f"c{i}" for i in range(len(columns))]
+        for i, col in enumerate(columns):
+            self.tree.heading(f"c{i}", text=col, command=lambda i=i: self.on_sort(i))
+            self.tree.column(f"c{i}", width=100, anchor="w", stretch=False)
+    
+    def fit_columns(self, columns, sample):
+        # Widths come from the header and a sample of rows, not from every row.
+        font = tkfont.nametofont("TkDefaultFont")
+        for i, col in enumerate(columns):
+            texts = [col] + [self.cell(row[i]) for row in sample]
+            width = max(font.measure(t) for t in texts) + 20
+            self.tree.column(f"c{i}", width=min(max(width, 60), 400))
+    
+    @staticmethod
+    def cell(value):
+        if value is None:
+            return "N/A"
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        return str(value)
+    
+    def page_query(self):
+        _, sql, params, columns = self.last_report
+        order = ""
+        if self.sort is not None:
+            index, desc = self.sort
+            terms = [f"{index + 1} {'DESC' if desc else 'ASC'}"]
+            terms += [str(i + 1) for i in range(len(columns)) if i != index]
+            order = " ORDER BY " + ", ".join(terms)
+        # One row past the page tells whether there is more to load.
+        return (f"SELECT * FROM ({sql}){order} LIMIT ? OFFSET ?",
+                tuple(params or ()) + (REPORT_PAGE_SIZE + 1, self.loaded))
+    
+    def fetch_page(self):
+        generation = self._generation
+        sql, params = self.page_query()
+        self.load_more_btn.state(["disabled"])
+        self.status_var.set("Running...")
+        query_executor.submit(report_cache.fetch, sql, params,
+                              on_done=lambda rows: self.display(generation, rows),
+                              on_error=lambda e: self._report_failed(generation, e),
+                              key=(id(self), "report"))
+    
+    def _report_failed(self, generation, error):
+        if generation == self._generation:
+            self.status_var.set("")
+            messagebox.showerror("Error", str(error))
+    
+    def display(self, generation, rows):
+        if generation != self._generation:
+            return
+        more = len(rows) > REPORT_PAGE_SIZE
+        rows = rows[:REPORT_PAGE_SIZE]
+        if self.loaded == 0:
+            if not rows:
+                self.status_var.set("No results found.")
+                return
+            self.fit_columns(self.last_report[3], rows[:REPORT_SAMPLE_ROWS])
+        self.loaded += len(rows)
+        self.render(generation, rows, 0, more)
+    
+    def render(self, generation, rows, start, more):
+        # Rows go in a chunk at a time so the window keeps repainting.
+        if generation != self._generation:
+            return
+        end = start + REPORT_RENDER_CHUNK
+        for row in rows[start:end]:
+            self.tree.insert("", "end", values=[self.cell(v) for v in row])
+        if end < len(rows):
+            self.after(1, self.render, generation, rows, end, more)
+            return
+        self.status_var.set(f"Showing {self.loaded} records" + (" (more available)" if more else ""))
+        if more:
+            self.load_more_btn.state(["!disabled"])
+    
+    def load_more(self):
+        if self.last_report is not None:
+            self.fetch_page()
+    
+    def on_sort(self, index):
+        if self.last_report is None:
+            return
+        desc = self.sort is not None and self.sort[0] == index and not self.sort[1]
+        self.sort = (index, desc)
+        for i, col in enumerate(self.last_report[3]):
+            arrow = (" \u25bc" if desc else " \u25b2") if i == index else ""
+            self.tree.heading(f"c{i}", text=col + arrow)
+        self.reload()
+    
+    def reload(self):
+        self._generation += 1
+        self.loaded = 0
+        self.tree.delete(*self.tree.get_children())
+        self.fetch_page()
+    
+    def date_range(self):
         try:
-            rows = db.execute_query(SQLQueries.get_low_stock(10), fetch=True)
-            self.display("LOW STOCK MEDICINES (<10)", rows, ["ID", "Medicine Name", "Stock"])
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            return date_range_params(self.start_var.get(), self.end_var.get())
+        except ValueError:
+            messagebox.showwarning("Warning", "Dates must be in YYYY-MM-DD format!")
+            return None
+    
+    def range_title(self, title):
+        start, end = self.start_var.get().strip(), self.end_var.get().strip()
+        if start or end:
+            return f"{title} ({start or '...'} - {end or '...'})"
+        return title
+    
+    def run_report(self, title, sql, params, columns):
+        self.last_report = (title, sql, params, columns)
+        self.sort = None
+        self.title_var.set(title)
+        self.set_columns(columns)
+        self.reload()
+    
+    def ask_export_path(self, name):
+        return filedialog.asksaveasfilename(
+            title="Export", initialfile=name, defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl")])
+    
+    def run_export(self, path, export):
+        progress = lambda n: query_executor.post(self.export_status.set, f"Exporting... {n} rows")
+        self.export_status.set("Exporting...")
+        query_executor.submit(lambda: export(progress),
+                              on_done=lambda n: self.export_status.set(f"Exported {n} rows to {os.path.basename(path)}"),
+                              on_error=self._export_failed,
+                              key=(id(self), "export"))
+    
+    def _export_failed(self, error):
+        self.export_status.set("")
+        messagebox.showerror("Error", f"Export error: {error}")
+    
+    def on_export_report(self):
+        if self.last_report is None:
+            messagebox.showwarning("Warning", "Run a report first!")
+            return
+        title, sql, params, columns = self.last_report
+        path = self.ask_export_path(title.split(" (")[0].lower().replace(" ", "_"))
+        if path:
+            self.run_export(path, lambda progress: export_query(sql, params, path, columns=columns, progress=progress))
+    
+    def on_export_table(self):
+        table = self.export_table_var.get()
+        path = self.ask_export_path(table.lower())
+        if path:
+            self.run_export(path, lambda progress: export_table(table, path, progress=progress))
+    
+    def show_low_stock(self):
+        self.run_report("LOW STOCK MEDICINES (<10)", SQLQueries.get_low_stock(10), None,
+                        ["ID", "Medicine Name", "Stock"])
     
     def show_expiring(self):
-        try:
-            rows = db.execute_query(SQLQueries.get_expiring_soon(30), fetch=True)
-            self.display("MEDICINES EXPIRING IN 30 DAYS", rows, ["Medicine", "Quantity", "Expiration Date", "Days Left"])
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.run_report("MEDICINES EXPIRING IN 30 DAYS", SQLQueries.get_expiring_soon(30), None,
+                        ["Medicine", "Quantity", "Expiration Date", "Days Left"])
     
     def show_daily_sales(self):
-        try:
-            rows = db.execute_query(SQLQueries.get_daily_sales(), fetch=True)
-            self.display("DAILY SALES SUMMARY", rows, ["Date", "Sales Count", "Total Revenue"])
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        params = self.date_range()
+        if params is None:
+            return
+        self.run_report(self.range_title("DAILY SALES SUMMARY"), SQLQueries.get_daily_sales(daily_sales_limit(params)), params,
+                        ["Date", "Sales Count", "Total Revenue"])
     
     def show_top_selling(self):
-        try:
-            rows = db.execute_query(SQLQueries.get_top_selling(10), fetch=True)
-            self.display("TOP 10 SELLING MEDICINES", rows, ["Medicine Name", "Quantity Sold", "Total Revenue"])
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        params = self.date_range()
+        if params is None:
+            return
+        self.run_report(self.range_title("TOP 10 SELLING MEDICINES"), SQLQueries.get_top_selling(10), params,
+                        ["Medicine Name", "Quantity Sold", "Total Revenue"])
     
     def show_oldest_patient(self):
-        try:
-            rows = db.execute_query(SQLQueries.get_oldest_patient(), fetch=True)
-            self.display("OLDEST PATIENT", rows, ["ID", "First Name", "Last Name", "Birth Date", "Age"])
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.run_report("OLDEST PATIENT", SQLQueries.get_oldest_patient(), None,
+                        ["ID", "First Name", "Last Name", "Birth Date", "Age"])
     
     def show_stock_status(self):
-        try:
-            rows = db.execute_query(SQLQueries.get_medicines_with_stock(), fetch=True)
-            self.display("MEDICINE STOCK STATUS", rows, ["ID", "Medicine", "Barcode", "Price", "Stock", "Manufacturer"])
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.run_report("MEDICINE STOCK STATUS", SQLQueries.get_medicines_with_stock(), None,
+                        ["ID", "Medicine", "Barcode", "Price", "Stock", "Manufacturer"])
+    
+    def show_malformed_dates(self):
+        self.run_report("MALFORMED DATES", SQLQueries.get_malformed_dates(), None,
+                        ["Table", "Row ID", "Column", "Value"])
+    
+    def show_sales_by_year(self):
+        self.run_report("SALES BY YEAR (INCLUDING ARCHIVES)", SQLQueries.get_sales_by_year(), None,
+                        ["Year", "Sales", "Quantity", "Revenue"])
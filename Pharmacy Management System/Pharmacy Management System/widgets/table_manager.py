@@ -1,13 +1,26 @@
 import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import db
+from executor import query_executor
 from metadata import TABS_INFO, KEY_FIELDS, AUTO_ID_FIELDS, INT_FIELDS, FLOAT_FIELDS, FK_MAP, REQUIRED_FIELDS
-from utils import to_int_or_none, to_float_or_none, fetch_all, fetch_fk_choices, parse_fk_choice, exists_medicine_id, count_refs
+from config import MAX_TREE_ITEMS
+from paging import KeysetPager
+from search import search_rows
+from importer import IMPORT_TABLES, import_csv
+from cascade import CascadeDelete, CascadeRekey
+from archive import attach_archives
+from expiry import ROW_TAGS, expiry_day_sql, row_expiry_codes
+from .autocomplete import AutocompletePicker
+from fk_cache import fk_cache
+from utils import to_int_or_none, to_float_or_none, parse_fk_choice, exists_medicine_id
+
+class ValidationError(Exception):
+    pass
 
 class TableManager(ttk.Frame):
     def __init__(self, parent, table_name, columns):
@@ -15,10 +28,19 @@ class TableManager(ttk.Frame):
         self.table = table_name
         self.columns = columns
         self.key_fields = KEY_FIELDS[self.table]
+        # Pages of tables with an expiry carry its day as a last column.
+        day_sql = expiry_day_sql(self.table)
+        self.extra = [day_sql] if day_sql else []
         self.original_key_values = None
         self.fk_widgets = {}
+        self.fk_choices = {}
         self.entry_widgets = {}
         self.var_strings = {}
+        self.pager = None
+        self._more_above = False
+        self._more_below = False
+        self._page_pending = False
+        self._write_pending = False
         self.create_widgets()
         self.refresh_fk_choices()
         self.load_data()
@@ -43,7 +65,7 @@ class TableManager(ttk.Frame):
             self.var_strings[col] = var
             
             if self.table in FK_MAP and col in FK_MAP[self.table]:
-                cb = ttk.Combobox(form_frame, textvariable=var, state="readonly", width=28)
+                cb = AutocompletePicker(form_frame, var, width=28)
                 cb.grid(row=i, column=1, sticky="w", padx=5, pady=3)
                 self.fk_widgets[col] = cb
             else:
@@ -62,6 +84,9 @@ class TableManager(ttk.Frame):
         ttk.Button(btn_frame, text="Update", command=self.on_update, width=10).grid(row=0, column=1, padx=2)
         ttk.Button(btn_frame, text="Delete", command=self.on_delete, width=10).grid(row=0, column=2, padx=2)
         ttk.Button(btn_frame, text="Clear", command=self.on_clear, width=10).grid(row=0, column=3, padx=2)
+        if self.table in IMPORT_TABLES:
+            ttk.Button(btn_frame, text="Import CSV", command=self.on_import, width=10).grid(
+                row=1, column=0, columnspan=2, padx=2, pady=(4, 0), sticky="w")
         
         search_frame = ttk.LabelFrame(self, text="Search", padding=5)
         search_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
@@ -82,33 +107,150 @@ class TableManager(ttk.Frame):
             self.tree.heading(col, text=heading)
             self.tree.column(col, width=100, anchor="center")
         self.tree.grid(row=0, column=0, sticky="nsew")
+        self.tree.tag_configure('expired', background='#ffcccc')
+        self.tree.tag_configure('expiring', background='#ffffcc')
         
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
         hsb = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscroll=vsb.set, xscroll=hsb.set)
-        vsb.grid(row=0, column=1, sticky="ns")
+        self.tree.configure(yscroll=self.on_tree_scroll, xscroll=hsb.set)
+        self.vsb.grid(row=0, column=1, sticky="ns")
         hsb.grid(row=1, column=0, sticky="ew")
         
+        self.count_var = tk.StringVar()
+        ttk.Label(tree_frame, textvariable=self.count_var, anchor="e").grid(row=2, column=0, sticky="ew")
+        
         self.tree.bind("<<TreeviewSelect>>", self.on_select)
     
     def refresh_fk_choices(self):
         if self.table not in FK_MAP:
             return
         for col, spec in FK_MAP[self.table].items():
-            ref_table, id_col, display_col = spec
-            choices = fetch_fk_choices(ref_table, id_col, display_col)
             if col in self.fk_widgets:
-                self.fk_widgets[col]['values'] = choices
+                query_executor.submit(fk_cache.get_indexed, *spec,
+                                      on_done=lambda choices, col=col: self._set_fk_choices(col, choices),
+                                      key=(id(self), "fk", col))
+    
+    def _set_fk_choices(self, col, choices):
+        # The cache hands back the same object until the table changes.
+        if self.fk_choices.get(col) is not choices:
+            self.fk_widgets[col].set_choices(choices)
+            self.fk_choices[col] = choices
     
     def load_data(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        try:
-            rows = fetch_all(self.table)
-            for row in rows:
-                self.tree.insert("", "end", values=row)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load data: {e}")
+        self.show_pages(KeysetPager(self.table, self.columns, extra=self.extra))
+    
+    def show_pages(self, pager):
+        self.pager = pager
+        self._page_pending = False
+        self.count_var.set("Loading...")
+        query_executor.submit(
+            lambda: (self.tag_rows(pager.first_page()), pager.count()),
+            on_done=lambda result: self._show_first_page(pager, *result),
+            on_error=lambda e: self._load_failed(e),
+            key=self.page_key)
+    
+    @property
+    def page_key(self):
+        return (id(self), "page")
+    
+    def _load_failed(self, error):
+        self._page_pending = False
+        self.count_var.set("")
+        messagebox.showerror("Error", f"Failed to load data: {error}")
+    
+    def _clear_tree(self):
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+    
+    def _show_first_page(self, pager, page, count):
+        if pager is not self.pager:
+            return
+        self._clear_tree()
+        self._insert_rows(page, "end")
+        self._more_above = False
+        self._more_below = len(page[0]) == pager.page_size
+        self.count_var.set(f"{count} rows")
+    
+    def show_rows(self, page):
+        self.pager = None
+        self._clear_tree()
+        self._insert_rows(page, "end")
+        self._more_above = self._more_below = False
+        self.count_var.set(f"{len(page[0])} matches")
+    
+    def tag_rows(self, rows):
+        # Runs on the worker with the fetch, so expired and expiring rows are
+        # tagged as they are inserted rather than in a second pass.
+        if rows is None:
+            return None
+        codes = row_expiry_codes(self.table, rows)
+        if codes is None:
+            return rows, None
+        return [row[:-1] for row in rows], [ROW_TAGS[code] for code in codes]
+    
+    def _insert_rows(self, page, where):
+        rows, tags = page
+        tags = tags or [()] * len(rows)
+        if where == "end":
+            for row, tag in zip(rows, tags):
+                self.tree.insert("", "end", iid=row[0], values=row[1:], tags=tag)
+        else:
+            for i, (row, tag) in enumerate(zip(rows, tags)):
+                self.tree.insert("", i, iid=row[0], values=row[1:], tags=tag)
+    
+    def on_tree_scroll(self, first, last):
+        self.vsb.set(first, last)
+        near_edge = (float(last) >= 0.9 and self._more_below) or (float(first) <= 0.1 and self._more_above)
+        if near_edge and not self._page_pending and self.pager is not None:
+            self._page_pending = True
+            self.after_idle(self._request_page)
+    
+    def _request_page(self):
+        children = self.tree.get_children()
+        pager = self.pager
+        if not children or pager is None:
+            self._page_pending = False
+            return
+        first, last = self.tree.yview()
+        if last >= 0.9 and self._more_below:
+            query_executor.submit(lambda key=int(children[-1]): self.tag_rows(pager.page_after(key)),
+                                  on_done=lambda page: self._apply_page(pager, page, "end"),
+                                  on_error=self._load_failed, key=self.page_key)
+        elif first <= 0.1 and self._more_above:
+            query_executor.submit(lambda key=int(children[0]): self.tag_rows(pager.page_before(key)),
+                                  on_done=lambda page: self._apply_page(pager, page, 0),
+                                  on_error=self._load_failed, key=self.page_key)
+        else:
+            self._page_pending = False
+    
+    def _apply_page(self, pager, page, where):
+        # Only a window of at most MAX_TREE_ITEMS rows lives in the Treeview;
+        # pages are fetched by key as the view nears either end of it.
+        self._page_pending = False
+        children = self.tree.get_children()
+        if pager is not self.pager or not children:
+            return
+        first, _ = self.tree.yview()
+        anchor = children[min(int(first * len(children)), len(children) - 1)]
+        
+        self._insert_rows(page, where)
+        children = self.tree.get_children()
+        excess = len(children) - MAX_TREE_ITEMS
+        if where == "end":
+            self._more_below = len(page[0]) == pager.page_size
+            if excess > 0:
+                self.tree.delete(*children[:excess])
+                self._more_above = True
+        else:
+            self._more_above = len(page[0]) == pager.page_size
+            if excess > 0:
+                self.tree.delete(*children[-excess:])
+                self._more_below = True
+        
+        children = self.tree.get_children()
+        if self.tree.exists(anchor):
+            self.tree.yview_moveto(self.tree.index(anchor) / len(children))
     
     def on_select(self, event):
         sel = self.tree.selection()
@@ -120,8 +262,8 @@ class TableManager(ttk.Frame):
             val = vals[i]
             if self.table in FK_MAP and col in FK_MAP[self.table]:
                 if val and val != "None" and val != "":
-                    choices = list(self.fk_widgets[col]['values'])
-                    match = next((c for c in choices if c.split(" - ")[0].strip() == str(val)), "")
+                    choices = self.fk_choices.get(col)
+                    match = choices.label_by_id.get(to_int_or_none(val), "") if choices else ""
                     self.var_strings[col].set(match)
                 else:
                     self.var_strings[col].set("")
@@ -151,7 +293,8 @@ class TableManager(ttk.Frame):
         
         return payload
     
-    def validate(self, payload, for_update=False):
+    def validate(self, payload):
+        # Checks that need no database; check_references runs on the worker.
         required = REQUIRED_FIELDS.get(self.table, [])
         
         for field in required:
@@ -161,33 +304,54 @@ class TableManager(ttk.Frame):
                 messagebox.showwarning("Warning", f"'{field_name}' field is required!")
                 return False
         
+        if self.table == "Stock" and payload.get("medicine_id") is None:
+            messagebox.showwarning("Warning", "Please select a medicine!")
+            return False
+        
+        return True
+    
+    def check_references(self, payload, original_key_values=None):
         if self.table == "Medicines":
             mid = payload.get("medicine_id")
             if mid is not None:
                 exclude = None
-                if for_update and self.original_key_values:
+                if original_key_values:
                     exclude = {
-                        "name": self.original_key_values.get("name"),
-                        "manufacturer_id": self.original_key_values.get("manufacturer_id")
+                        "name": original_key_values.get("name"),
+                        "manufacturer_id": original_key_values.get("manufacturer_id")
                     }
                 if exists_medicine_id(mid, exclude):
-                    messagebox.showwarning("Warning", f"Medicine ID {mid} is already in use!")
-                    return False
+                    raise ValidationError(f"Medicine ID {mid} is already in use!")
         
         if self.table == "Stock":
             mid = payload.get("medicine_id")
-            if mid is None:
-                messagebox.showwarning("Warning", "Please select a medicine!")
-                return False
             if not exists_medicine_id(mid):
-                messagebox.showwarning("Warning", f"Selected medicine (ID: {mid}) not found!")
-                return False
+                raise ValidationError(f"Selected medicine (ID: {mid}) not found!")
+    
+    def submit_write(self, fn, on_done, on_error):
+        # Checks and writes run on the worker like loads do, so a large
+        # cascade shows the busy indicator instead of freezing the window.
+        if self._write_pending:
+            messagebox.showwarning("Warning", "The previous change is still being saved.")
+            return
+        self._write_pending = True
         
-        return True
+        def done(result):
+            self._write_pending = False
+            on_done(result)
+        
+        def failed(error):
+            self._write_pending = False
+            if isinstance(error, ValidationError):
+                messagebox.showwarning("Warning", str(error))
+            else:
+                on_error(error)
+        
+        query_executor.submit(fn, on_done=done, on_error=failed)
     
     def on_add(self):
         payload = self.get_payload()
-        if not self.validate(payload, for_update=False):
+        if not self.validate(payload):
             return
         
         cols = [c for c in self.columns if c not in AUTO_ID_FIELDS or payload[c] is not None]
@@ -196,12 +360,19 @@ class TableManager(ttk.Frame):
         
         sql = f"INSERT INTO {self.table} ({', '.join(cols)}) VALUES ({placeholders})"
         
-        try:
+        def add():
+            self.check_references(payload)
             db.execute_query(sql, tuple(vals))
-            self.load_data()
-            self.on_clear()
-            messagebox.showinfo("Success", "Record added successfully.")
-        except sqlite3.IntegrityError as e:
+        
+        self.submit_write(add, lambda _: self._added(), self._add_failed)
+    
+    def _added(self):
+        self.load_data()
+        self.on_clear()
+        messagebox.showinfo("Success", "Record added successfully.")
+    
+    def _add_failed(self, e):
+        if isinstance(e, sqlite3.IntegrityError):
             error_msg = str(e)
             if "UNIQUE constraint" in error_msg:
                 messagebox.showerror("Error", "This record already exists! (Uniqueness violation)")
@@ -209,55 +380,94 @@ class TableManager(ttk.Frame):
                 messagebox.showerror("Error", f"Required field cannot be empty!\n{error_msg}")
             else:
                 messagebox.showerror("Error", f"Integrity error: {e}")
-        except Exception as e:
+        else:
             messagebox.showerror("Error", f"Add error: {e}")
     
+    def on_import(self):
+        path = filedialog.askopenfilename(title=f"Import {self.table}",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        self.count_var.set("Importing...")
+        progress = lambda r: query_executor.post(self.count_var.set, f"Importing... {r.imported} of {r.read} rows")
+        query_executor.submit(
+            lambda: import_csv(self.table, path, progress=progress),
+            on_done=self._import_finished,
+            on_error=lambda e: self._import_failed(e),
+            key=(id(self), "import"))
+
+    def _import_finished(self, result):
+        self.load_data()
+        message = f"{result.imported} rows imported, {result.rejected} rejected."
+        if result.error_path:
+            message += f"\nRejected rows were written to:\n{result.error_path}"
+        messagebox.showinfo("Import", message)
+
+    def _import_failed(self, error):
+        self.count_var.set("")
+        messagebox.showerror("Error", f"Import error: {error}")
+
     def on_update(self):
         if not self.original_key_values:
             messagebox.showwarning("Warning", "Please select a row first.")
             return
         
         payload = self.get_payload()
-        if not self.validate(payload, for_update=True):
+        if not self.validate(payload):
             return
         
+        original = dict(self.original_key_values)
+        rekey = None
         if self.table == "Medicines":
-            self._handle_medicine_update(payload)
+            old_mid = self._get_selected_medicine_id()
+            new_mid = payload.get("medicine_id")
+            if old_mid and new_mid and str(old_mid) != str(new_mid):
+                rekey = CascadeRekey("Medicines", "medicine_id", old_mid, new_mid)
+        
+        def check():
+            self.check_references(payload, original)
+            return rekey.related_counts() if rekey is not None else {}
+        
+        self.submit_write(check, lambda counts: self._confirm_update(payload, original, rekey, counts),
+                          lambda e: messagebox.showerror("Error", f"Update error: {e}"))
+    
+    def _confirm_update(self, payload, original, rekey, counts):
+        listed = self._describe_related(counts)
+        if not listed or not messagebox.askyesno("Related Records",
+                f"This medicine has {listed} records.\n"
+                f"Do you want to update medicine_id from {rekey.old_value} to {rekey.new_value} in all records?"):
+            rekey = None
         
         set_clause = ", ".join([f"{col} = ?" for col in self.columns])
         where_clause = " AND ".join([f"{k} = ?" for k in self.key_fields])
         
-        params = [payload[c] for c in self.columns] + [self.original_key_values[k] for k in self.key_fields]
+        params = [payload[c] for c in self.columns] + [original[k] for k in self.key_fields]
         sql = f"UPDATE {self.table} SET {set_clause} WHERE {where_clause}"
         
-        try:
-            db.execute_query(sql, tuple(params))
-            self.load_data()
-            self.on_clear()
-            messagebox.showinfo("Success", "Record updated successfully.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Update error: {e}")
-    
-    def _handle_medicine_update(self, payload):
-        old_mid = self._get_selected_medicine_id()
-        new_mid = payload.get("medicine_id")
-        
-        if old_mid and new_mid and str(old_mid) != str(new_mid):
-            cnt_s = count_refs("Stock", "medicine_id", old_mid)
-            cnt_p = count_refs("Prescription", "medicine_id", old_mid)
-            cnt_sale = count_refs("Sales", "medicine_id", old_mid)
-            total = cnt_s + cnt_p + cnt_sale
-            
-            if total > 0:
-                if messagebox.askyesno("Related Records",
-                    f"This medicine has {cnt_s} stock, {cnt_p} prescription and {cnt_sale} sales records.\n"
-                    f"Do you want to update medicine_id from {old_mid} to {new_mid} in all records?"):
-                    try:
-                        db.execute_query("UPDATE Stock SET medicine_id = ? WHERE medicine_id = ?", (new_mid, old_mid))
-                        db.execute_query("UPDATE Prescription SET medicine_id = ? WHERE medicine_id = ?", (new_mid, old_mid))
-                        db.execute_query("UPDATE Sales SET medicine_id = ? WHERE medicine_id = ?", (new_mid, old_mid))
-                    except Exception as e:
-                        messagebox.showerror("Error", f"Failed to update related records: {e}")
+        def update():
+            # apply() cannot attach the archive inside the transaction, and
+            # this may be another worker's connection than the check's.
+            attach_archives()
+            # References move together with the row, or not at all.
+            with db.transaction(immediate=True) as conn:
+                if rekey is not None:
+                    rekey.apply(conn)
+                conn.execute(sql, tuple(params))
+        
+        self.submit_write(update, lambda _: self._changed("Record updated successfully."),
+                          lambda e: messagebox.showerror("Error", f"Update error: {e}"))
+    
+    def _changed(self, message):
+        self.load_data()
+        self.on_clear()
+        messagebox.showinfo("Success", message)
+    
+    @staticmethod
+    def _describe_related(counts):
+        parts = [f"{n} {t.lower()}" for t, n in counts.items() if n]
+        if len(parts) > 1:
+            return ", ".join(parts[:-1]) + " and " + parts[-1]
+        return parts[0] if parts else ""
     
     def _get_selected_medicine_id(self):
         if self.table != "Medicines":
@@ -280,108 +490,19 @@ class TableManager(ttk.Frame):
         if not messagebox.askyesno("Confirm", "Are you sure you want to delete this record?"):
             return
         
-        try:
-            if self.table == "Medicines":
-                self._cascade_delete_medicine()
-            elif self.table == "Manufacturer":
-                self._cascade_delete_manufacturer()
-            elif self.table == "Doctor":
-                self._cascade_delete_doctor()
-            elif self.table == "Pharmacist":
-                self._cascade_delete_pharmacist()
-            elif self.table == "Patient":
-                self._cascade_delete_patient()
-            else:
-                self._delete_direct()
-            
-            self.load_data()
-            self.on_clear()
-            messagebox.showinfo("Success", "Record deleted successfully.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Delete error: {e}")
-    
-    def _delete_direct(self):
-        where = " AND ".join([f"{k} = ?" for k in self.key_fields])
-        vals = [self.original_key_values[k] for k in self.key_fields]
-        db.execute_query(f"DELETE FROM {self.table} WHERE {where}", tuple(vals))
-    
-    def _cascade_delete_medicine(self):
-        mid = self._get_selected_medicine_id()
-        if mid:
-            cnt_s = count_refs("Stock", "medicine_id", mid)
-            cnt_p = count_refs("Prescription", "medicine_id", mid)
-            cnt_sale = count_refs("Sales", "medicine_id", mid)
-            total = cnt_s + cnt_p + cnt_sale
-            
-            if total > 0:
-                if not messagebox.askyesno("Related Records",
-                    f"This medicine has {cnt_s} stock, {cnt_p} prescription and {cnt_sale} sales records.\n"
-                    f"Do you want to delete all of them?"):
-                    return
-                
-                db.execute_query("DELETE FROM Stock WHERE medicine_id = ?", (mid,))
-                db.execute_query("DELETE FROM Prescription WHERE medicine_id = ?", (mid,))
-                db.execute_query("DELETE FROM Sales WHERE medicine_id = ?", (mid,))
-        
-        self._delete_direct()
-    
-    def _cascade_delete_manufacturer(self):
-        man_id = self.original_key_values["manufacturer_id"]
-        meds = db.execute_query(
-            "SELECT medicine_id FROM Medicines WHERE manufacturer_id = ?", 
-            (man_id,), fetch=True
-        )
-        
-        if meds:
-            if not messagebox.askyesno("Related Records",
-                f"This manufacturer has {len(meds)} medicines. Do you want to delete all of them?"):
-                return
-            
-            for (mid,) in meds:
-                if mid:
-                    db.execute_query("DELETE FROM Stock WHERE medicine_id = ?", (mid,))
-                    db.execute_query("DELETE FROM Prescription WHERE medicine_id = ?", (mid,))
-                    db.execute_query("DELETE FROM Sales WHERE medicine_id = ?", (mid,))
-            
-            db.execute_query("DELETE FROM Medicines WHERE manufacturer_id = ?", (man_id,))
-        
-        self._delete_direct()
-    
-    def _cascade_delete_doctor(self):
-        did = self.original_key_values["doctor_id"]
-        cnt = count_refs("Prescription", "doctor_id", did)
-        
-        if cnt > 0:
-            if not messagebox.askyesno("Related Records",
-                f"This doctor has {cnt} prescriptions. Do you want to delete them?"):
-                return
-            db.execute_query("DELETE FROM Prescription WHERE doctor_id = ?", (did,))
-        
-        self._delete_direct()
+        cascade = CascadeDelete(self.table, self.original_key_values)
+        self.submit_write(cascade.related_counts, lambda counts: self._confirm_delete(cascade, counts),
+                          lambda e: messagebox.showerror("Error", f"Delete error: {e}"))
     
-    def _cascade_delete_pharmacist(self):
-        pid = self.original_key_values["p_id"]
-        cnt = count_refs("Sales", "p_id", pid)
-        
-        if cnt > 0:
+    def _confirm_delete(self, cascade, counts):
+        listed = self._describe_related(counts)
+        if listed:
             if not messagebox.askyesno("Related Records",
-                f"This pharmacist has {cnt} sales. Do you want to delete them?"):
+                f"This {self.table.lower()} record has {listed} records.\n"
+                f"Do you want to delete all of them?"):
                 return
-            db.execute_query("DELETE FROM Sales WHERE p_id = ?", (pid,))
-        
-        self._delete_direct()
-    
-    def _cascade_delete_patient(self):
-        pid = self.original_key_values["patient_id"]
-        cnt = count_refs("Prescription", "patient_id", pid)
-        
-        if cnt > 0:
-            if not messagebox.askyesno("Related Records",
-                f"This patient has {cnt} prescriptions. Do you want to delete them?"):
-                return
-            db.execute_query("DELETE FROM Prescription WHERE patient_id = ?", (pid,))
-        
-        self._delete_direct()
+        self.submit_write(cascade.execute, lambda _: self._changed("Record deleted successfully."),
+                          lambda e: messagebox.showerror("Error", f"Delete error: {e}"))
     
     def on_search(self):
         query = self.search_var.get().strip()
@@ -389,16 +510,19 @@ class TableManager(ttk.Frame):
             self.load_data()
             return
         
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.pager = None
+        self.count_var.set("Searching...")
+        query_executor.submit(lambda: self.tag_rows(search_rows(self.table, self.columns, query, extra=self.extra)),
+                              on_done=lambda page: self._show_search(query, page),
+                              on_error=lambda e: messagebox.showerror("Error", f"Search error: {e}"),
+                              key=self.page_key)
+    
+    def _show_search(self, query, page):
+        if page is not None:
+            self.show_rows(page)
+            return
         
         like = f"%{query}%"
         where_parts = [f"CAST({c} AS TEXT) LIKE ?" for c in self.columns]
-        sql = f"SELECT * FROM {self.table} WHERE {' OR '.join(where_parts)}"
-        
-        try:
-            rows = db.execute_query(sql, tuple(like for _ in self.columns), fetch=True)
-            for row in rows:
-                self.tree.insert("", "end", values=row)
-        except Exception as e:
-            messagebox.showerror("Error", f"Search error: {e}")
+        self.show_pages(KeysetPager(self.table, self.columns, " OR ".join(where_parts),
+                                    tuple(like for _ in self.columns), extra=self.extra))